@@ -0,0 +1,131 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+"""
+Benchmark of .hdr encoding of equirectangular World images by render_studio.world.hdr
+with round-trip accuracy check.
+Run with python: python benchmarks/hdr_encode.py [--sizes 2048 4096]
+Run with Blender to compare with Image.save_render:
+    blender -b --factory-startup --python benchmarks/hdr_encode.py -- [--sizes 2048 4096]
+"""
+from pathlib import Path
+import argparse
+import importlib.util
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+HDR_MODULE = Path(__file__).parents[1] / "src/hydrarpr/render_studio/world/hdr.py"
+SIZES = (2048, 4096, 8192)
+MAX_RELATIVE_ERROR = 1.0 / 128      # RGBE has 8 bit mantissa shared by all channels
+
+
+def load_hdr_module():
+    spec = importlib.util.spec_from_file_location("hdr", HDR_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_equirect(width):
+    """Returns sky-like float32 image (width / 2, width, 3): gradient, sun and noisy ground"""
+    height = width // 2
+    rng = np.random.default_rng(0)
+    theta = np.linspace(0.0, np.pi, height, dtype=np.float32)[:, None]
+    phi = np.linspace(0.0, 2.0 * np.pi, width, dtype=np.float32)[None, :]
+
+    sky = np.empty((height, width, 3), dtype=np.float32)
+    sky[..., 0] = 0.3 + 0.4 * np.cos(theta / 2)
+    sky[..., 1] = 0.4 + 0.4 * np.cos(theta / 2)
+    sky[..., 2] = 0.9 + 0.1 * np.cos(phi / 4)
+
+    sun = np.exp(-((theta - 0.6) ** 2 + (phi - 2.0) ** 2) * 2000.0) * 5000.0
+    sky += sun[..., None]
+
+    ground = slice(height // 2, height)
+    sky[ground] = rng.random((height - height // 2, width, 3), dtype=np.float32) * 0.2
+    return sky
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def measure_save_render(rgb, filepath: Path, repeat):
+    import bpy
+
+    height, width = rgb.shape[:2]
+    image = bpy.data.images.new("hdr_benchmark", width, height, alpha=True, float_buffer=True)
+    pixels = np.ones((height, width, 4), dtype=np.float32)
+    # Blender stores rows from bottom to top
+    pixels[..., :3] = rgb[::-1]
+    image.pixels.foreach_set(pixels.ravel())
+
+    scene = bpy.context.scene
+    scene.render.image_settings.file_format = 'HDR'
+    scene.render.image_settings.color_mode = 'RGB'
+    try:
+        return measure(lambda: image.save_render(filepath=str(filepath)), repeat)
+
+    finally:
+        bpy.data.images.remove(image)
+
+
+def main(args):
+    hdr = load_hdr_module()
+    try:
+        import bpy  # noqa: F401
+        has_bpy = True
+
+    except ImportError:
+        has_bpy = False
+
+    with tempfile.TemporaryDirectory(prefix="hydrarpr_bench_") as temp_dir:
+        filepath = Path(temp_dir) / "image.hdr"
+
+        print(f"{'size':>11} {'encode, s':>10} {'save_render, s':>15} {'MB':>7} {'max error':>10}")
+        for width in args.sizes:
+            rgb = create_equirect(width)
+
+            encode_time = measure(lambda: hdr.write_hdr(filepath, rgb), args.repeat)
+            size = filepath.stat().st_size
+
+            decoded = hdr.read_hdr(filepath)
+            error = np.abs(decoded - rgb) / np.maximum(rgb.max(axis=-1, keepdims=True), 1e-30)
+            max_error = float(error.max())
+
+            save_render_time = measure_save_render(rgb, filepath, args.repeat) if has_bpy else None
+
+            print(f"{width:>5}x{width // 2:<5} {encode_time:>10.3f} "
+                  f"{save_render_time if save_render_time is not None else float('nan'):>15.3f} "
+                  f"{size / 2 ** 20:>7.1f} {max_error:>10.5f}")
+
+            assert max_error <= MAX_RELATIVE_ERROR, f"Round-trip error {max_error} is too big"
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Widths of images")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the fastest one is taken")
+    main(parser.parse_args(argv))
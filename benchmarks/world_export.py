@@ -0,0 +1,493 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+"""
+Micro-benchmarks of World export: NodeItem arithmetic, NodeParser traversal, compiled plans
+and get_world_data on synthetic node trees. Runs with python outside of Blender, bpy, pxr
+and addon preferences are replaced by lightweight stand-ins.
+Reports ops/sec, peak traced memory of a single call and memory blocks retained per call,
+compares results with the stored baseline and exits with code 1 on regressions.
+Speed is compared relative to the reference workload, which is measured in the same run,
+so that results of a slower or loaded machine are comparable with the baseline.
+get_world_data benchmarks include file system checks, they are informational.
+
+    python benchmarks/world_export.py [--filter parser] [--size 64]
+    python benchmarks/world_export.py --save-baseline
+"""
+from pathlib import Path
+import argparse
+import gc
+import importlib
+import json
+import logging
+import sys
+import time
+import tracemalloc
+import types
+
+import numpy as np
+
+
+SRC_DIR = Path(__file__).parents[1] / "src"
+BASELINE_FILE = Path(__file__).parent / "baselines" / "world_export.json"
+SIZE = 64               # number of nodes in synthetic node trees
+MIN_TIME = 0.2          # seconds of a single measurement
+REPEAT = 7              # the fastest measurement is taken
+TOLERANCE = 0.5         # allowed relative slowdown against the baseline
+REFERENCE = 'reference'
+# regressions of these benchmarks are reported, but don't fail the run
+INFORMATIONAL_PREFIXES = ('world_data.',)
+
+PROPERTY_TYPES = {bool: 'BOOLEAN', int: 'INT', float: 'FLOAT', str: 'ENUM'}
+
+
+# BPY STAND-INS
+class StandInProperty:
+    def __init__(self, identifier, prop_type):
+        self.identifier = identifier
+        self.type = prop_type
+
+
+class StandInRNA:
+    def __init__(self, properties):
+        self.properties = properties
+
+
+class StandInCollection(list):
+    """bpy_prop_collection: items are accessed by index or name"""
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return next(item for item in self if item.name == key)
+
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        if isinstance(key, str):
+            return any(item.name == key for item in self)
+
+        return super().__contains__(key)
+
+
+class StandInSocket:
+    def __init__(self, name, identifier=None, default_value=None):
+        self.name = name
+        self.identifier = identifier or name
+        if default_value is not None:
+            self.default_value = default_value
+        self.links = []
+
+
+class StandInLink:
+    def __init__(self, from_node, from_socket, to_node, to_socket):
+        self.from_node = from_node
+        self.from_socket = from_socket
+        self.to_node = to_node
+        self.to_socket = to_socket
+        self.is_valid = True
+        self.is_muted = False
+
+
+def create_bpy():
+    bpy = types.ModuleType("bpy")
+
+    class ID:
+        pass
+
+    class Image(ID):
+        pass
+
+    class World(ID):
+        pass
+
+    class Node:
+        pass
+
+    class NodeReroute(Node):
+        pass
+
+    class ShaderNode(Node):
+        bl_rna = StandInRNA([StandInProperty(name, 'STRING') for name in ("name", "label")])
+
+    bpy.types = types.SimpleNamespace(ID=ID, Image=Image, World=World, Node=Node,
+                                      NodeReroute=NodeReroute, ShaderNode=ShaderNode)
+
+    settings = types.SimpleNamespace(channel="benchmark", progressive_world=False, verify_textures=False,
+                                     bake_world=False, bake_world_resolution='1024')
+    bpy.context = types.SimpleNamespace(scene=types.SimpleNamespace(
+        hydra_rpr=types.SimpleNamespace(render_studio=settings)))
+    bpy.app = types.SimpleNamespace(timers=types.SimpleNamespace(
+        is_registered=lambda func: False, register=lambda func, first_interval=0.0: None))
+    bpy.path = types.SimpleNamespace(clean_name=lambda name: name)
+    return bpy
+
+
+def create_logging():
+    """Stand-in of addon logging module, which formats messages like it does, but drops them"""
+    module = types.ModuleType("hydrarpr.logging")
+    module.__file__ = str(SRC_DIR / "hydrarpr/logging.py")
+
+    class Log:
+        def __init__(self, tag):
+            self.logger = logging.getLogger("hydrarpr").getChild(tag)
+
+        def __call__(self, *args):
+            self.debug(*args)
+
+        def debug(self, *args):
+            self.logger.debug(", ".join(str(arg) for arg in args))
+
+        info = warn = error = critical = debug
+
+    module.Log = Log
+    return module
+
+
+def install_stand_ins():
+    """Registers stand-ins in sys.modules and imports hydrarpr World export modules"""
+    sys.modules['bpy'] = create_bpy()
+
+    pxr = types.ModuleType("pxr")
+    pxr.Sdf = pxr.UsdLux = types.SimpleNamespace()
+    sys.modules['pxr'] = pxr
+
+    # packages are created without running their __init__, which registers Blender classes
+    for name, path in (("hydrarpr", SRC_DIR / "hydrarpr"),
+                       ("hydrarpr.render_studio", SRC_DIR / "hydrarpr/render_studio")):
+        package = types.ModuleType(name)
+        package.__path__ = [str(path)]
+        sys.modules[name] = package
+
+    sys.modules['hydrarpr.logging'] = create_logging()
+    preferences = types.ModuleType("hydrarpr.preferences")
+    preferences.preferences = lambda: types.SimpleNamespace(rs_workspace_dir="", rs_image_cache_size=0)
+    sys.modules['hydrarpr.preferences'] = preferences
+
+    world = importlib.import_module("hydrarpr.render_studio.world")
+    for name in ("node_parser", "nodes", "compiler"):
+        importlib.import_module(f"hydrarpr.render_studio.world.{name}")
+
+    return world
+
+
+class StandInNodeTree:
+    def __init__(self, bpy):
+        self.bpy = bpy
+        self.nodes = StandInCollection()
+        self.links = []
+
+    def new(self, bl_idname, inputs=(), outputs=(), **props):
+        """Adds node, inputs and outputs are (name, identifier, default_value)"""
+        node_cls = self.bpy.types.NodeReroute if bl_idname == 'NodeReroute' else self.bpy.types.Node
+        node = node_cls()
+        node.name = f"{bl_idname}.{len(self.nodes):04}"
+        node.bl_idname = bl_idname
+        node.mute = False
+        node.inputs = StandInCollection(StandInSocket(*socket) for socket in inputs)
+        node.outputs = StandInCollection(StandInSocket(*socket) for socket in outputs)
+        node.bl_rna = StandInRNA([*self.bpy.types.ShaderNode.bl_rna.properties,
+                                  *(StandInProperty(key, PROPERTY_TYPES[type(value)])
+                                    for key, value in props.items())])
+        for key, value in props.items():
+            setattr(node, key, value)
+
+        self.nodes.append(node)
+        return node
+
+    def link(self, from_node, from_key, to_node, to_key):
+        link = StandInLink(from_node, from_node.outputs[from_key], to_node, to_node.inputs[to_key])
+        to_node.inputs[to_key].links = [link]
+        self.links.append(link)
+
+    # nodes used by synthetic trees
+    def output(self):
+        return self.new('ShaderNodeOutputWorld', inputs=[("Surface",), ("Volume",)], is_active_output=True)
+
+    def background(self):
+        return self.new('ShaderNodeBackground',
+                        inputs=[("Color", None, (0.8, 0.8, 0.8, 1.0)), ("Strength", None, 1.0)],
+                        outputs=[("Background",)])
+
+    def rgb(self, color):
+        return self.new('ShaderNodeRGB', outputs=[("Color", None, color)])
+
+    def value(self, value):
+        return self.new('ShaderNodeValue', outputs=[("Value", None, value)])
+
+    def math(self, operation):
+        return self.new('ShaderNodeMath',
+                        inputs=[("Value", "Value", 0.5), ("Value", "Value_001", 0.5), ("Value", "Value_002", 0.5)],
+                        outputs=[("Value",)], operation=operation, use_clamp=False)
+
+    def mix(self, blend_type='MIX'):
+        return self.new('ShaderNodeMixRGB',
+                        inputs=[("Fac", None, 0.5), ("Color1", None, (0.0, 0.0, 0.0, 1.0)),
+                                ("Color2", None, (1.0, 1.0, 1.0, 1.0))],
+                        outputs=[("Color",)], blend_type=blend_type, use_clamp=False)
+
+    def reroute(self):
+        return self.new('NodeReroute', inputs=[("Input",)], outputs=[("Output",)])
+
+
+# SYNTHETIC WORLDS
+def create_world(bpy, name, build):
+    """Returns World, which node tree is built by build(tree, background, size)"""
+    world = bpy.types.World()
+    world.name = world.name_full = name
+    world.use_nodes = True
+    world.color = (0.05, 0.05, 0.05)
+    world.node_tree = tree = StandInNodeTree(bpy)
+
+    output = tree.output()
+    background = tree.background()
+    tree.link(background, "Background", output, "Surface")
+    world.build = lambda size: build(tree, background, size)
+    return world
+
+
+def build_wide(tree, background, size):
+    """Binary tree of Mix nodes over size RGB nodes"""
+    level = [tree.rgb((i / size, 0.5, 1.0 - i / size, 1.0)) for i in range(size)]
+    while len(level) > 1:
+        next_level = []
+        for first, second in zip(level[::2], level[1::2]):
+            mix = tree.mix()
+            tree.link(first, "Color", mix, "Color1")
+            tree.link(second, "Color", mix, "Color2")
+            next_level.append(mix)
+
+        level = next_level + level[len(level) // 2 * 2:]
+
+    tree.link(level[0], "Color", background, "Color")
+
+
+def build_deep(tree, background, size):
+    """Chain of size Math nodes"""
+    prev = tree.value(0.1)
+    for i in range(size):
+        node = tree.math('ADD' if i % 2 else 'MULTIPLY')
+        tree.link(prev, "Value", node, 0)
+        prev = node
+
+    tree.link(prev, "Value", background, "Strength")
+
+
+def build_shared(tree, background, size):
+    """Lattice of Math nodes: each node uses both nodes of the previous layer"""
+    layer = [tree.value(0.5), tree.value(0.25)]
+    for _ in range(size // 2):
+        layer_nodes = [tree.math('ADD'), tree.math('MAXIMUM')]
+        for node in layer_nodes:
+            tree.link(layer[0], "Value", node, 0)
+            tree.link(layer[1], "Value", node, 1)
+        layer = layer_nodes
+
+    tree.link(layer[0], "Value", background, "Strength")
+
+
+def build_reroute(tree, background, size):
+    """RGB and Value nodes are linked to Background through chains of size reroutes"""
+    for src, from_key, to_key in ((tree.rgb((1.0, 0.5, 0.25, 1.0)), "Color", "Color"),
+                                  (tree.value(2.0), "Value", "Strength")):
+        prev, prev_key = src, from_key
+        for _ in range(size):
+            reroute = tree.reroute()
+            tree.link(prev, prev_key, reroute, "Input")
+            prev, prev_key = reroute, "Output"
+
+        tree.link(prev, prev_key, background, to_key)
+
+
+GRAPHS = {
+    'wide': build_wide,
+    'deep': build_deep,
+    'shared': build_shared,
+    'reroute': build_reroute,
+}
+
+
+# BENCHMARKS
+def get_benchmarks(world_module, bpy, size):
+    """Returns dict: name -> function without arguments"""
+    from hydrarpr.render_studio.world import compiler
+    from hydrarpr.render_studio.world.node_parser import NodeItem
+    from hydrarpr.render_studio.world.nodes import ShaderNodeOutputWorld
+
+    scalar, other = NodeItem(0.25), NodeItem(4.0)
+    color3, color4 = NodeItem((0.2, 0.4, 0.6)), NodeItem((0.1, 0.3, 0.5, 1.0))
+    grid = NodeItem(np.random.default_rng(0).random((128, 256, 3), dtype=np.float32), 3)
+    grid_fac = NodeItem(np.random.default_rng(1).random((128, 256), dtype=np.float32))
+
+    benchmarks = {
+        'nodeitem.scalar_add': lambda: scalar + other,
+        'nodeitem.scalar_math': lambda: ((scalar * 2.0 + other) / other).clamp(),
+        'nodeitem.color_blend': lambda: scalar.blend(color3, color4),
+        'nodeitem.color_if_else': lambda: color4.if_else('>', color3, color3, color4),
+        'nodeitem.batched_blend_256x128': lambda: grid_fac.blend(grid, color4),
+    }
+
+    for name, build in GRAPHS.items():
+        world = create_world(bpy, name, build)
+        world.build(size)
+        output = world.node_tree.nodes[0]
+
+        benchmarks[f'parser.{name}'] = \
+            lambda world=world, output=output: ShaderNodeOutputWorld(world, output).export()
+        benchmarks[f'compiled.{name}'] = \
+            lambda world=world, output=output: compiler.evaluate(world, output)
+        benchmarks[f'world_data.{name}'] = lambda world=world: world_module.get_world_data(world)
+
+    return benchmarks
+
+
+def reference():
+    """Fixed Python and NumPy workload, which measures speed of the machine"""
+    total = 0.0
+    for i in range(200):
+        total += i * 0.5
+    return np.add(np.ones(16), total)
+
+
+def measure(func, min_time):
+    """Returns ops/sec of the fastest of REPEAT runs, each run lasts at least min_time"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        duration = time.perf_counter() - start
+        if duration >= min_time:
+            break
+
+        number = max(number * 2, int(number * min_time / max(duration, 1e-9)))
+
+    best = duration
+    for _ in range(REPEAT - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+
+    return number / best
+
+
+def measure_memory(func, number=100):
+    """Returns peak traced memory in KB of a single call and memory blocks retained per call"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        func()
+        peak_kb = (tracemalloc.get_traced_memory()[1] - current) / 1024
+
+    finally:
+        tracemalloc.stop()
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    for _ in range(number):
+        func()
+    gc.collect()
+    retained = (sys.getallocatedblocks() - blocks) / number
+
+    return peak_kb, retained
+
+
+def compare(results, baseline, tolerance):
+    """Returns list of (name, regression description)"""
+    # baseline speed is scaled by the speed of the machine
+    scale = 1.0
+    if REFERENCE in results and REFERENCE in baseline:
+        scale = results[REFERENCE]['ops_per_sec'] / baseline[REFERENCE]['ops_per_sec']
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or name == REFERENCE:
+            continue
+
+        expected = base['ops_per_sec'] * scale
+        if result['ops_per_sec'] < expected * (1.0 - tolerance):
+            regressions.append((name, f"{name}: {result['ops_per_sec']:.0f} ops/sec, "
+                                      f"baseline {expected:.0f} scaled by reference {scale:.2f}"))
+
+        # small absolute slack, tiny peaks are noisy
+        if result['peak_kb'] > base['peak_kb'] * (1.0 + tolerance) + 1.0:
+            regressions.append((name, f"{name}: peak {result['peak_kb']:.1f} KB, "
+                                      f"baseline {base['peak_kb']:.1f} KB"))
+
+    return regressions
+
+
+def main(args):
+    world_module = install_stand_ins()
+    benchmarks = get_benchmarks(world_module, sys.modules['bpy'], args.size)
+
+    baseline = {}
+    if BASELINE_FILE.is_file():
+        baseline = json.loads(BASELINE_FILE.read_text())['results']
+
+    # reference is always measured to scale the baseline
+    benchmarks = {REFERENCE: reference, **benchmarks}
+    results = {}
+    print(f"{'benchmark':<32} {'ops/sec':>12} {'baseline':>12} {'peak KB':>9} {'retained':>9}")
+    for name, func in benchmarks.items():
+        if args.filter and args.filter not in name and name != REFERENCE:
+            continue
+
+        ops_per_sec = measure(func, args.min_time)
+        peak_kb, retained = measure_memory(func)
+        results[name] = {'ops_per_sec': round(ops_per_sec, 1), 'peak_kb': round(peak_kb, 2),
+                         'retained_blocks': round(retained, 3)}
+
+        base = baseline.get(name, {}).get('ops_per_sec')
+        print(f"{name:<32} {ops_per_sec:>12.0f} {base if base else float('nan'):>12.0f} "
+              f"{peak_kb:>9.1f} {retained:>9.2f}")
+
+    if args.save_baseline:
+        if args.filter:
+            results = {**baseline, **results}
+
+        BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_FILE.write_text(json.dumps({
+            'size': args.size,
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'results': results,
+        }, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline is saved to {BASELINE_FILE}")
+        return 0
+
+    failed = False
+    for name, regression in compare(results, baseline, args.tolerance):
+        if name.startswith(INFORMATIONAL_PREFIXES):
+            print("SLOWER (informational)", regression)
+        else:
+            print("REGRESSION", regression)
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--filter", default="", help="Run benchmarks, which names contain the string")
+    parser.add_argument("--size", type=int, default=SIZE, help="Number of nodes in synthetic node trees")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="Seconds of a single measurement")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Allowed relative slowdown and memory growth against the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Store results as the baseline")
+    sys.exit(main(parser.parse_args()))
@@ -12,8 +12,48 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ********************************************************************
+import time
+
 import bpy
 
+from .viewport import ViewportController, tag_redraw
+
+from . import logging
+log = logging.Log("engine")
+
+
+CALIBRATION_SAMPLES = 8     # samples of the calibration render of time budget mode
+BUDGET_SAFETY = 0.9         # share of the remaining time budget, which is planned for samples
+# render setting -> property of QualitySettings
+RAY_DEPTH_SETTINGS = {
+    'rpr:quality:rayDepth': 'max_ray_depth',
+    'rpr:quality:rayDepthDiffuse': 'max_ray_depth_diffuse',
+    'rpr:quality:rayDepthGlossy': 'max_ray_depth_glossy',
+    'rpr:quality:rayDepthRefraction': 'max_ray_depth_refraction',
+    'rpr:quality:rayDepthGlossyRefraction': 'max_ray_depth_glossy_refraction',
+    'rpr:quality:rayDepthShadow': 'max_ray_depth_shadow',
+}
+
+# incremented by update callbacks of render settings properties, undo and file loading
+settings_version = 0
+# render settings built from properties: engine_type -> (settings_version, scene pointer, settings)
+settings_cache = {}
+
+
+def invalidate_render_settings():
+    global settings_version
+    settings_version += 1
+
+
+@bpy.app.handlers.persistent
+def on_settings_reset(*args):
+    # undo, file loading and animation playback change properties without update callbacks
+    invalidate_render_settings()
+
+
+HANDLERS = (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post,
+            bpy.app.handlers.frame_change_post)
+
 
 class RPRHydraRenderEngine(bpy.types.HydraRenderEngine):
     bl_idname = 'RPRHydraRenderEngine'
@@ -25,7 +65,152 @@ class RPRHydraRenderEngine(bpy.types.HydraRenderEngine):
 
     bl_delegate_id = "HdRprPlugin"
 
+    def __init__(self):
+        super().__init__()
+        # render settings delivered to Hydra engine: ((engine pointer, settings_version, scene pointer),
+        # settings)
+        self.delivered_settings = (None, {})
+        # render settings of time budget mode for the current final render pass
+        self.budget_settings = {}
+        self.viewport_controller = ViewportController(self.on_viewport_change)
+
+    def __del__(self):
+        if hasattr(self, 'viewport_controller'):
+            self.viewport_controller.stop()
+
+        if hasattr(super(), '__del__'):
+            super().__del__()
+
+    def on_viewport_change(self):
+        if self.viewport_controller.is_suspended and self.engine_ptr and \
+                bpy.context.scene.hydra_rpr.viewport.idle_release:
+            # viewport isn't redrawn, redraw of released engine resumes it
+            self.release_engine()
+            return
+
+        # view_update of the tagged engine with empty depsgraph updates delivers adapted settings,
+        # it is called on the next redraw, which isn't scheduled by tag_update() from a timer
+        self.tag_update()
+        tag_redraw()
+
+    def release_engine(self):
+        """Frees Hydra engine, it is created again by the base view_update on the next activity"""
+        import _bpy_hydra
+
+        _bpy_hydra.engine_free(self.engine_ptr)
+        self.engine_ptr = None
+        # new engine could get the same pointer
+        self.delivered_settings = (None, {})
+
+    def get_settings_overrides(self, engine_type):
+        """Returns render settings, which are adapted by the engine itself"""
+        if engine_type != 'VIEWPORT':
+            return self.budget_settings
+
+        settings = bpy.context.scene.hydra_rpr.viewport
+        if not ViewportController.is_enabled(settings):
+            return {}
+
+        return self.viewport_controller.get_render_settings(settings)
+
     def get_render_settings(self, engine_type):
+        """Returns only settings, which weren't delivered to the current Hydra engine yet"""
+        overrides = self.get_settings_overrides(engine_type)
+        state = (self.engine_ptr, settings_version, bpy.context.scene.as_pointer(),
+                 tuple(overrides.items()))
+        delivered_state, delivered = self.delivered_settings
+        if delivered_state == state:
+            return {}
+
+        if not delivered_state or delivered_state[0] != self.engine_ptr:
+            # new engine needs all settings
+            delivered = {}
+
+        settings = get_cached_render_settings(engine_type)
+        if overrides:
+            settings = {**settings, **overrides}
+
+        changed = {key: val for key, val in settings.items()
+                   if key not in delivered or delivered[key] != val}
+        self.delivered_settings = (state, {**delivered, **changed})
+        return changed
+
+    def view_update(self, context, depsgraph):
+        settings = context.scene.hydra_rpr.viewport
+        # activity is handled before the base view_update, so it delivers adapted settings
+        if ViewportController.is_enabled(settings) and depsgraph.updates:
+            self.viewport_controller.on_activity(time.perf_counter(), settings)
+
+        super().view_update(context, depsgraph)
+
+    def view_draw(self, context, depsgraph):
+        super().view_draw(context, depsgraph)
+
+        settings = context.scene.hydra_rpr.viewport
+        if not ViewportController.is_enabled(settings):
+            return
+
+        if self.viewport_controller.is_suspended and not self.engine_ptr:
+            # viewport of released engine is redrawn
+            self.viewport_controller.on_activity(time.perf_counter(), settings)
+            self.tag_update()
+            return
+
+        view = (context.region_data.perspective_matrix.copy(), context.region.width, context.region.height)
+        if self.viewport_controller.on_frame(time.perf_counter(), view, settings):
+            self.tag_update()
+
+    def render(self, depsgraph):
+        settings = depsgraph.scene.hydra_rpr.final
+        if not settings.use_time_budget or not self.engine_ptr:
+            super().render(depsgraph)
+            return
+
+        # calibration render measures sampling rate, it is rendered without adaptive sampling
+        calibration_samples = min(CALIBRATION_SAMPLES, settings.max_samples)
+        self.budget_settings = {
+            'rpr:maxSamples': calibration_samples,
+            'rpr:adaptiveSampling:noiseTreshold': 0.0,
+        }
+        self.update_stats("", "Time budget: calibration")
+        start_time = time.perf_counter()
+        self.render_pass(depsgraph)
+        calibration_time = time.perf_counter() - start_time
+        if self.test_break():
+            self.budget_settings = {}
+            return
+
+        # calibration time includes render startup, so the sampling rate is underestimated
+        rate = calibration_samples / max(calibration_time, 1e-3)
+        time_left = settings.time_budget - calibration_time
+        self.budget_settings = get_budget_settings(settings, rate, time_left)
+        if self.budget_settings:
+            self.update_stats("", f"Time budget: {self.budget_settings['rpr:maxSamples']} samples")
+            self.render_pass(depsgraph)
+
+        samples = self.budget_settings.get('rpr:maxSamples', calibration_samples)
+        frame_time = time.perf_counter() - start_time
+        log("Time budget render", f"frame: {depsgraph.scene.frame_current}, samples: {samples}, "
+            f"time: {frame_time:.1f} s, budget: {settings.time_budget:.1f} s, "
+            f"calibration: {calibration_time:.1f} s")
+        self.update_stats("", f"Time budget: {samples} samples in {frame_time:.1f} s")
+        if frame_time > settings.time_budget:
+            log.warn("Time budget is exceeded", f"frame: {depsgraph.scene.frame_current}, "
+                     f"time: {frame_time:.1f} s, budget: {settings.time_budget:.1f} s")
+
+        self.budget_settings = {}
+
+    def render_pass(self, depsgraph):
+        """Renders with the current budget settings, the base render() doesn't deliver render settings"""
+        import _bpy_hydra
+
+        for key, val in self.get_render_settings('FINAL').items():
+            _bpy_hydra.engine_set_render_setting(self.engine_ptr, key, val)
+
+        super().render(depsgraph)
+
+    @staticmethod
+    def build_render_settings(engine_type):
         if engine_type == 'VIEWPORT':
             settings = bpy.context.scene.hydra_rpr.viewport
             quality = settings.interactive_quality
@@ -86,6 +271,58 @@ class RPRHydraRenderEngine(bpy.types.HydraRenderEngine):
             self.register_pass(scene, render_layer, 'Position', 4, 'XYZA', 'VECTOR')
 
 
-register, unregister = bpy.utils.register_classes_factory((
+def get_budget_settings(settings, rate, time_left):
+    """
+    Returns render settings, which fit the final render to time_left with sampling rate in samples
+    per second, or empty dict if calibration render has to be kept.
+    """
+    samples = min(int(rate * time_left * BUDGET_SAFETY), settings.max_samples)
+    if samples <= CALIBRATION_SAMPLES:
+        return {}
+
+    result = {}
+    quality = settings.quality
+    min_samples = min(settings.min_adaptive_samples, settings.max_samples)
+    if settings.time_budget_ray_depth and samples < min_samples:
+        # time of a sample is approximated as proportional to max ray depth
+        ray_depth = max(quality.max_ray_depth * samples // min_samples, 1)
+        samples = min(samples * quality.max_ray_depth // ray_depth, min_samples)
+        result |= {key: min(getattr(quality, prop), ray_depth) for key, prop in RAY_DEPTH_SETTINGS.items()}
+
+    result |= {
+        'rpr:maxSamples': samples,
+        'rpr:adaptiveSampling:minSamples': min(settings.min_adaptive_samples, samples),
+    }
+    return result
+
+
+def get_cached_render_settings(engine_type):
+    """Returns render settings of the current scene, they are rebuilt only when they are changed"""
+    scene_ptr = bpy.context.scene.as_pointer()
+    cached = settings_cache.get(engine_type)
+    if cached and cached[:2] == (settings_version, scene_ptr):
+        return cached[2]
+
+    settings = RPRHydraRenderEngine.build_render_settings(engine_type)
+    settings_cache[engine_type] = (settings_version, scene_ptr, settings)
+    return settings
+
+
+register_classes, unregister_classes = bpy.utils.register_classes_factory((
     RPRHydraRenderEngine,
 ))
+
+
+def register():
+    register_classes()
+    for handlers in HANDLERS:
+        handlers.append(on_settings_reset)
+
+
+def unregister():
+    for handlers in HANDLERS:
+        if on_settings_reset in handlers:
+            handlers.remove(on_settings_reset)
+
+    unregister_classes()
+    settings_cache.clear()
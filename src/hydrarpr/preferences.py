@@ -71,6 +71,19 @@ class RPR_HYDRA_ADDON_PT_preferences(bpy.types.AddonPreferences):
                ('.usdc', "usdc", "Random-access \"Crate\" binary")),
         default='.usd',
     )
+    rs_image_cache_size: bpy.props.IntProperty(
+        name="Image Cache Size, MB",
+        description="Disk budget of the cache of World images converted for syncing, "
+                    "least recently used images are removed when it is exceeded",
+        min=0, max=1024 * 1024,
+        default=2048,
+    )
+    rs_telemetry_file: bpy.props.BoolProperty(
+        name="Write Sync Statistics",
+        description="Write durations of sync phases and written bytes as JSON lines "
+                    "to hydrarpr_telemetry.jsonl next to hydrarpr.log",
+        default=False,
+    )
 
     def draw(self, context):
         layout = self.layout
@@ -88,6 +101,8 @@ class RPR_HYDRA_ADDON_PT_preferences(bpy.types.AddonPreferences):
             col.prop(self, "rs_workspace_url")
             # col.prop(self, "rs_workspace_dir")
             col.prop(self, "rs_file_format")
+            col.prop(self, "rs_image_cache_size")
+            col.prop(self, "rs_telemetry_file")
 
 
 def preferences():
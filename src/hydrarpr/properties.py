@@ -26,6 +26,11 @@ from bpy.props import (
 )
 
 
+def render_settings_update(self, context):
+    from .engine import invalidate_render_settings
+    invalidate_render_settings()
+
+
 class Properties(bpy.types.PropertyGroup):
     bl_type = None
 
@@ -49,18 +54,21 @@ class QualitySettings(bpy.types.PropertyGroup):
                     "before being terminated",
         min=1, max=50,
         default=8,
+        update=render_settings_update,
     )
     max_ray_depth_diffuse: IntProperty(
         name="Diffuse Ray Depth",
         description="The maximum number of times that a light ray can be bounced off diffuse surfaces",
         min=0, max=50,
         default=3,
+        update=render_settings_update,
     )
     max_ray_depth_glossy: IntProperty(
         name="Glossy Ray Depth",
         description="The maximum number of ray bounces from specular surfaces",
         min=0, max=50,
         default=3,
+        update=render_settings_update,
     )
     max_ray_depth_refraction: IntProperty(
         name="Refraction Ray Depth",
@@ -68,6 +76,7 @@ class QualitySettings(bpy.types.PropertyGroup):
                     "designated for clear transparent materials, such as glass",
         min=0, max=50,
         default=3,
+        update=render_settings_update,
     )
     max_ray_depth_glossy_refraction: IntProperty(
         name="Glossy Refraction Ray Depth",
@@ -76,6 +85,7 @@ class QualitySettings(bpy.types.PropertyGroup):
                     "such as semi-frosted glass",
         min=0, max=50,
         default=3,
+        update=render_settings_update,
     )
     max_ray_depth_shadow: IntProperty(
         name="Shadow Ray Depth",
@@ -84,6 +94,7 @@ class QualitySettings(bpy.types.PropertyGroup):
                     "its way causing these surfaces to cast shadows",
         min=0, max=50,
         default=2,
+        update=render_settings_update,
     )
     raycast_epsilon: FloatProperty(
         name="Ray Cast Epsilon",
@@ -92,11 +103,13 @@ class QualitySettings(bpy.types.PropertyGroup):
         subtype='DISTANCE',
         min=1e-6, max=1.0,
         default=2e-3,
+        update=render_settings_update,
     )
     enable_radiance_clamping: BoolProperty(
         name="Clamp Fireflies",
         description="Clamp Fireflies",
         default=False,
+        update=render_settings_update,
     )
     radiance_clamping: FloatProperty(
         name="Max Radiance",
@@ -104,12 +117,14 @@ class QualitySettings(bpy.types.PropertyGroup):
                     "Greater clamp radiance values produce more brightness. Set to 0 ot disable clamping",
         min=0.0, max=1e6,
         default=0.0,
+        update=render_settings_update,
     )
     pixel_filter_width: FloatProperty(
         name="Width",
         description="Pixel filter width",
         min=0.0, max=5.0,
         default=1.5,
+        update=render_settings_update,
     )
 
 
@@ -119,11 +134,13 @@ class InteractiveQualitySettings(bpy.types.PropertyGroup):
         description="Controls value of 'Max Ray Depth' in interactive mode",
         min=1, max=50,
         default=2,
+        update=render_settings_update,
     )
     enable_downscale: BoolProperty(
         name="Downscale Resolution",
         description="Controls whether in interactive mode resolution should be downscaled or no",
         default=True,
+        update=render_settings_update,
     )
     resolution_downscale: IntProperty(
         name="Resolution Downscale",
@@ -132,6 +149,29 @@ class InteractiveQualitySettings(bpy.types.PropertyGroup):
                     "smaller rendering resolution",
         min=0, max=10,
         default=3,
+        update=render_settings_update,
+    )
+    adaptive_downscale: BoolProperty(
+        name="Adaptive Resolution",
+        description="Adapt resolution downscale to keep interactive frame time near the target "
+                    "while the view is navigated or edited, 'Resolution Downscale' is the maximum. "
+                    "Full resolution is restored when the view settles",
+        default=False,
+        update=render_settings_update,
+    )
+    target_frame_time: FloatProperty(
+        name="Target Frame Time",
+        description="Interactive frame time, which adaptive resolution tries to keep",
+        subtype='TIME_ABSOLUTE',
+        min=0.01, max=1.0,
+        default=0.05,
+    )
+    adaptive_ray_depth: BoolProperty(
+        name="Adaptive Ray Depth",
+        description="Lower max ray depth, when frame time is still above the target "
+                    "at the maximum resolution downscale",
+        default=False,
+        update=render_settings_update,
     )
 
 
@@ -202,18 +242,21 @@ class DenoiseSettings(bpy.types.PropertyGroup):
         name="AI Denoising",
         description="Enable AI Denoising",
         default=False,
+        update=render_settings_update,
     )
     min_iter: IntProperty(
         name="Min Iteration",
         description="The first iteration on which denoising should be applied",
         min=1, max=2 ** 16,
         default=4,
+        update=render_settings_update,
     )
     iter_step: IntProperty(
         name="Iteration Step",
         description="Denoise use frequency. To denoise on each iteration, set to 1",
         min=1, max=2 ** 16,
         default=32,
+        update=render_settings_update,
     )
 
 
@@ -224,6 +267,7 @@ class RenderSettings(bpy.types.PropertyGroup):
         items=(('GPU', "GPU", "GPU render device"),
                ('CPU', "CPU", "Legacy render device")),
         default='GPU',
+        update=render_settings_update,
     )
     render_quality: EnumProperty(
         name="Render Quality",
@@ -231,6 +275,7 @@ class RenderSettings(bpy.types.PropertyGroup):
         items=(('Northstar', "Full", "Full render quality"),
                ('HybridPro', "Interactive", "Interactive render quality")),
         default='Northstar',
+        update=render_settings_update,
     )
     render_mode: EnumProperty(
         name="Render Mode",
@@ -248,18 +293,21 @@ class RenderSettings(bpy.types.PropertyGroup):
             ('Contour', "Contour", "Contour render mode"),
         ),
         default='Global Illumination',
+        update=render_settings_update,
     )
     ao_radius: FloatProperty(
         name="AO Radius",
         description="Ambient Occlusion Radius",
         min=0.0, max=100.0,
         default=1.0,
+        update=render_settings_update,
     )
     max_samples: IntProperty(
         name="Max Samples",
         description="Maximum number of samples to render for each pixel",
         min=1, max=2 ** 16,
         default=256,
+        update=render_settings_update,
     )
     min_adaptive_samples: IntProperty(
         name="Min Samples",
@@ -267,6 +315,7 @@ class RenderSettings(bpy.types.PropertyGroup):
                     "will stop sampling pixels where noise is less than 'Variance Threshold'",
         min=1, max=2 ** 16,
         default=64,
+        update=render_settings_update,
     )
     variance_threshold: FloatProperty(
         name="Noise Threshold",
@@ -274,17 +323,72 @@ class RenderSettings(bpy.types.PropertyGroup):
                     "no more samples are added. Set to 0 for no cutoff",
         min=0.0, max=1.0,
         default=0.05,
+        update=render_settings_update,
     )
     enable_alpha: BoolProperty(
         name="Enable Color Alpha",
         description="World background is transparent, for compositing the render over another background",
         default=False,
+        update=render_settings_update,
     )
     enable_motion_blur: BoolProperty(
         name="Enable Beauty Motion Blur",
         description="If disabled, only velocity AOV will store information about movement on the scene.\n"
                     "Required for motion blur that is generated in post-processing",
         default=True,
+        update=render_settings_update,
+    )
+    auto_quality: BoolProperty(
+        name="Auto Quality",
+        description="Viewport renders with Interactive quality while the view is moved or the scene "
+                    "is edited,\nand switches to Full quality when the viewport is idle",
+        default=False,
+        update=render_settings_update,
+    )
+    idle_time: FloatProperty(
+        name="Idle Time",
+        description="Viewport switches to Full quality when it isn't moved or edited for this time",
+        subtype='TIME_ABSOLUTE',
+        min=0.5, max=60.0,
+        default=2.0,
+    )
+    idle_suspend: BoolProperty(
+        name="Suspend When Idle",
+        description="Viewport stops sampling when it isn't moved or edited for Suspend Time, "
+                    "e.g. when Blender window is unfocused.\nSampling is resumed on the next activity",
+        default=False,
+        update=render_settings_update,
+    )
+    suspend_time: FloatProperty(
+        name="Suspend Time",
+        description="Viewport stops sampling when it isn't moved or edited for this time",
+        subtype='TIME_ABSOLUTE',
+        min=5.0, max=3600.0,
+        default=60.0,
+    )
+    idle_release: BoolProperty(
+        name="Release Render Device",
+        description="Free viewport render engine, when sampling is suspended, to release memory of render device.\n"
+                    "Scene is synced and rendered again on the next activity",
+        default=False,
+    )
+    use_time_budget: BoolProperty(
+        name="Time Budget",
+        description="Final render of a frame fits to Time Limit: samples are set by the sampling rate,\n"
+                    "which is measured by a short calibration render",
+        default=False,
+    )
+    time_budget: FloatProperty(
+        name="Time Limit",
+        description="Render time of a frame in time budget mode, scene export isn't included",
+        subtype='TIME_ABSOLUTE',
+        min=1.0, max=24 * 3600.0,
+        default=90.0,
+    )
+    time_budget_ray_depth: BoolProperty(
+        name="Adapt Ray Depth",
+        description="Lower max ray depths, when Time Limit doesn't allow Min Samples",
+        default=False,
     )
 
     quality: PointerProperty(type=QualitySettings)
@@ -306,11 +410,51 @@ class RenderStudioSettings(bpy.types.PropertyGroup):
         default=False,
         update=live_sync_update,
     )
+    sync_delay: FloatProperty(
+        name="Sync Delay",
+        description="Quiet period: live sync waits until scene updates stop coming for this time",
+        subtype='TIME_ABSOLUTE',
+        min=0.0, max=10.0,
+        default=0.3,
+    )
+    sync_max_latency: FloatProperty(
+        name="Max Latency",
+        description="Maximum time live sync can be postponed by continuous scene updates",
+        subtype='TIME_ABSOLUTE',
+        min=0.0, max=60.0,
+        default=2.0,
+    )
+    sync_duty_cycle: FloatProperty(
+        name="Max Sync Load",
+        description="Maximum share of time, which live sync can take: pause between syncs "
+                    "is adapted to the measured duration of recent syncs",
+        subtype='FACTOR',
+        min=0.01, max=1.0,
+        default=0.25,
+    )
     channel: StringProperty(
         name="Channel",
         description="Syncing Channel: directory to which the files will be synchronized",
         default=f"Blender/{platform.node()}",
     )
+    sync_mode: EnumProperty(
+        name="Sync Mode",
+        description="How scene changes are synced",
+        items=(('FULL', "Full", "Export the whole scene on every sync"),
+               ('INCREMENTAL', "Incremental",
+                "Write changed objects to the delta layer, the whole scene is exported only "
+                "when objects are added or removed")),
+        default='FULL',
+    )
+    channel_layout: EnumProperty(
+        name="Layout",
+        description="Layout of the synced Usd files in the channel",
+        items=(('SINGLE', "Single File", "The whole scene is written to a single file"),
+               ('PER_OBJECT', "Per Object",
+                "Root file sublayers one file per top-level object and World, "
+                "only changed files are rewritten")),
+        default='SINGLE',
+    )
     filename: StringProperty(
         name="Custom File Name",
         description="The name of the synced Usd file: live empty to use current scene name",
@@ -366,6 +510,32 @@ class RenderStudioSettings(bpy.types.PropertyGroup):
         name="Overwrite Textures",
         default=False,
     )
+    progressive_world: BoolProperty(
+        name="Progressive World Texture",
+        description="Sync low resolution proxy of World texture first and replace it with "
+                    "the full resolution texture, when it is staged in the background",
+        default=True,
+    )
+    bake_world: BoolProperty(
+        name="Bake Procedural World",
+        description="Evaluate procedural World node tree per pixel and sync it as equirectangular "
+                    "World texture",
+        default=False,
+    )
+    bake_world_resolution: EnumProperty(
+        name="Bake Resolution",
+        description="Width of baked World texture",
+        items=(('1024', "1024 x 512", ""),
+               ('2048', "2048 x 1024", ""),
+               ('4096', "4096 x 2048", "")),
+        default='2048',
+    )
+    verify_textures: BoolProperty(
+        name="Verify Texture Content",
+        description="Compare content of textures, which have the same size but different modification "
+                    "time, instead of staging them again",
+        default=False,
+    )
     use_instancing: BoolProperty(
         name="Instancing",
         default=False,
@@ -32,3 +32,5 @@ def unregister():
 
     if resolver.rs_resolver.is_connected:
         resolver.rs_resolver.disconnect()
+
+    resolver.rs_resolver.writer.stop()
@@ -0,0 +1,295 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+import numpy as np
+
+import bpy
+from pxr import Sdf, Usd, UsdGeom, Gf, Vt, Tf
+
+from . import world
+from .layout import create_root_layer
+
+from .. import logging
+log = logging.Log("rs.incremental")
+
+
+LAYER_FORMAT = ".usdc"
+
+
+def get_prim_path(obj, root_prim_path):
+    """Returns path of object prim the same way as Blender USD exporter builds it"""
+    names = []
+    while obj:
+        names.append(Tf.MakeValidIdentifier(obj.name))
+        obj = obj.parent
+
+    path = Sdf.Path(root_prim_path) if root_prim_path else Sdf.Path.absoluteRootPath
+    for name in reversed(names):
+        path = path.AppendChild(name)
+
+    return path
+
+
+def get_matrix(matrix):
+    """Converts Blender matrix to Gf.Matrix4d, which uses row vectors"""
+    return Gf.Matrix4d([tuple(row) for row in matrix.transposed()])
+
+
+def set_attr(layer, path, name, type_name, value):
+    prim_spec = Sdf.CreatePrimInLayer(layer, path)
+    attr_spec = prim_spec.attributes.get(name)
+    if not attr_spec:
+        attr_spec = Sdf.AttributeSpec(prim_spec, name, type_name)
+
+    attr_spec.default = value
+
+
+def is_exported(obj, settings):
+    """Checks if object is exported by Blender USD exporter with Render Studio settings"""
+    original = obj.original
+    if settings.selected_objects_only and not original.select_get():
+        return False
+
+    if settings.visible_objects_only and not original.visible_get():
+        return False
+
+    return settings.evaluation_mode != 'RENDER' or not original.hide_render
+
+
+def get_world_name(depsgraph):
+    scene_world = depsgraph.scene.world
+    return scene_world.name_full if scene_world else None
+
+
+class IncrementalSync:
+    """
+    Syncs scene to the channel as root layer with three sublayers: base layer, which is
+    created by Blender USD exporter, stronger delta layer, which contains overrides of
+    changed geometry and World, and the strongest transform layer with object transforms.
+    Full export is done only when structure of the scene is changed.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.state = None
+        self.usd_path = None
+        self.base_layers = {}
+        self.base_parts = {}
+        self.delta_layer = None
+        self.xform_layer = None
+        self.world_name = None
+        self._topology = {}
+
+    @property
+    def base_path(self):
+        return self.usd_path.with_name(f"{self.usd_path.stem}.base{LAYER_FORMAT}")
+
+    @property
+    def delta_path(self):
+        return self.usd_path.with_name(f"{self.usd_path.stem}.delta{LAYER_FORMAT}")
+
+    @property
+    def xform_path(self):
+        return self.usd_path.with_name(f"{self.usd_path.stem}.xform{LAYER_FORMAT}")
+
+    def sync(self, usd_path, export_func, export_settings, updates=None):
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+
+        # fast path: transform updates of exported objects can't change scene structure, so there
+        # is no need to check it. New object could be reported only by transform update
+        if updates is not None and updates.is_transform_only and self.state and \
+                self.state[0] == usd_path and updates.transform <= self.state[1]:
+            log("Transform sync", updates.transform)
+            self._sync_transforms(depsgraph, updates.transform)
+            self.writer.write_snapshot(self.xform_layer, self.xform_path)
+            return
+
+        settings = bpy.context.scene.hydra_rpr.render_studio
+        # hiding of object is reported as structure update, it changes exported objects
+        objects = frozenset(obj.name for obj in depsgraph.objects if is_exported(obj, settings))
+        state = (usd_path, objects, settings.export_world, settings.channel_layout,
+                 tuple(sorted(export_settings.items())))
+
+        if updates is not None and not updates.full and state == self.state and \
+                self._sync_delta(depsgraph, updates):
+            return
+
+        self._sync_full(usd_path, export_func, depsgraph)
+        self.state = state
+
+    def _sync_full(self, usd_path, export_func, depsgraph):
+        self.usd_path = usd_path
+        # base layer files are going to be rewritten
+        self.base_layers.clear()
+        self._topology.clear()
+
+        log("Full sync", usd_path)
+        base_layer, self.base_parts = export_func(self.base_path, export_world=False)
+
+        self.delta_layer = Sdf.Layer.CreateAnonymous(LAYER_FORMAT)
+        self._sync_world(depsgraph)
+        self.writer.write_snapshot(self.delta_layer, self.delta_path, world.get_textures_digest())
+
+        self.xform_layer = Sdf.Layer.CreateAnonymous(LAYER_FORMAT)
+        self.writer.write_snapshot(self.xform_layer, self.xform_path)
+
+        root_layer = create_root_layer(base_layer, usd_path.suffix)
+        root_layer.subLayerPaths.append(f"./{self.xform_path.name}")
+        root_layer.subLayerPaths.append(f"./{self.delta_path.name}")
+        root_layer.subLayerPaths.append(f"./{self.base_path.name}")
+        self.writer.write(root_layer, usd_path)
+
+    def _sync_transforms(self, depsgraph, names):
+        objects = self.state[1]
+        root_prim_path = bpy.context.scene.hydra_rpr.render_studio.root_prim_path
+
+        for name in names:
+            if name not in objects:
+                continue
+
+            obj = bpy.data.objects[name].evaluated_get(depsgraph)
+            matrix = obj.matrix_world
+            if obj.parent:
+                matrix = obj.parent.matrix_world.inverted() @ matrix
+
+            set_attr(self.xform_layer, get_prim_path(obj, root_prim_path),
+                     'xformOp:transform', Sdf.ValueTypeNames.Matrix4d, get_matrix(matrix))
+
+    def _sync_delta(self, depsgraph, updates):
+        log("Delta sync", updates.transform, updates.geometry, updates.world)
+        objects = self.state[1]
+        root_prim_path = bpy.context.scene.hydra_rpr.render_studio.root_prim_path
+
+        for name in updates.geometry:
+            if name not in objects:
+                continue
+
+            obj = bpy.data.objects[name].evaluated_get(depsgraph)
+            if not self._sync_geometry(obj, get_prim_path(obj, root_prim_path)):
+                log("Object geometry can't be synced incrementally", obj)
+                return False
+
+        if updates.world or get_world_name(depsgraph) != self.world_name:
+            self._sync_world(depsgraph)
+
+        self.writer.write_snapshot(self.delta_layer, self.delta_path, world.get_textures_digest())
+
+        if updates.transform:
+            self._sync_transforms(depsgraph, updates.transform)
+            self.writer.write_snapshot(self.xform_layer, self.xform_path)
+
+        return True
+
+    def _sync_geometry(self, obj, path):
+        if obj.type != 'MESH':
+            return False
+
+        path = path.AppendChild(Tf.MakeValidIdentifier(obj.original.data.name))
+        topology = self._get_topology(path)
+        if not topology:
+            return False
+
+        mesh = obj.to_mesh()
+        try:
+            if topology[:3] != (len(mesh.vertices), len(mesh.polygons), len(mesh.loops)):
+                return False
+
+            if not mesh.vertices:
+                return True
+
+            points = np.empty((len(mesh.vertices), 3), dtype=np.float32)
+            mesh.vertices.foreach_get('co', points.ravel())
+            set_attr(self.delta_layer, path, 'points', Sdf.ValueTypeNames.Point3fArray,
+                     Vt.Vec3fArray.FromNumpy(points))
+            set_attr(self.delta_layer, path, 'extent', Sdf.ValueTypeNames.Float3Array,
+                     Vt.Vec3fArray([Gf.Vec3f(*points.min(axis=0).tolist()),
+                                    Gf.Vec3f(*points.max(axis=0).tolist())]))
+
+            normals_count = topology[3]
+            if normals_count is None:
+                return True
+
+            normals = np.empty((normals_count, 3), dtype=np.float32)
+            if normals_count == len(mesh.loops):
+                if hasattr(mesh, 'corner_normals'):
+                    mesh.corner_normals.foreach_get('vector', normals.ravel())
+                else:
+                    mesh.calc_normals_split()
+                    mesh.loops.foreach_get('normal', normals.ravel())
+
+            elif normals_count == len(mesh.vertices):
+                mesh.vertices.foreach_get('normal', normals.ravel())
+
+            else:
+                return False
+
+            set_attr(self.delta_layer, path, 'normals', Sdf.ValueTypeNames.Normal3fArray,
+                     Vt.Vec3fArray.FromNumpy(normals))
+            return True
+
+        finally:
+            obj.to_mesh_clear()
+
+    def _get_topology(self, path):
+        """Returns counts of points, faces, face vertices and normals of mesh in the base layer"""
+        if path in self._topology:
+            return self._topology[path]
+
+        # with per object layout mesh is in the file of its top-level prim
+        file_path = next((self.base_parts[prefix] for prefix in path.GetPrefixes()
+                          if prefix in self.base_parts), self.base_path)
+        base_layer = self.base_layers.get(file_path)
+        if not base_layer:
+            # base layer could be still written in the background
+            self.writer.flush()
+            base_layer = Sdf.Layer.FindOrOpen(str(file_path))
+            self.base_layers[file_path] = base_layer
+
+        def get_len(name):
+            attr = base_layer.GetAttributeAtPath(path.AppendProperty(name))
+            return len(attr.default) if attr and attr.default is not None else None
+
+        topology = (get_len('points'), get_len('faceVertexCounts'), get_len('faceVertexIndices'),
+                    get_len('normals'))
+        if None in topology[:3]:
+            topology = None
+
+        self._topology[path] = topology
+        return topology
+
+    def _sync_world(self, depsgraph):
+        self.world_name = get_world_name(depsgraph)
+
+        path = Sdf.Path("/World")
+        if self.delta_layer.GetPrimAtPath(path):
+            edit = Sdf.BatchNamespaceEdit()
+            edit.Add(path, Sdf.Path.emptyPath)
+            self.delta_layer.Apply(edit)
+
+        if not bpy.context.scene.hydra_rpr.render_studio.export_world:
+            return
+
+        world_layer = Sdf.Layer.CreateAnonymous(LAYER_FORMAT)
+        stage = Usd.Stage.Open(world_layer)
+        # Blender exports stages with Z up axis
+        UsdGeom.SetStageUpAxis(stage, UsdGeom.Tokens.z)
+        try:
+            world.sync(stage, depsgraph)
+
+        except Exception as err:
+            log.error("Can't sync World", err)
+            return
+
+        if world_layer.GetPrimAtPath(path):
+            Sdf.CopySpec(world_layer, path, self.delta_layer, path)
@@ -0,0 +1,134 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+from pathlib import Path
+
+from pxr import Sdf, UsdUtils
+
+from .. import logging
+log = logging.Log("rs.layout")
+
+
+PART_FORMAT = ".usdc"
+ROOT_PART_NAME = "_root"
+STAGE_METADATA = ('upAxis', 'metersPerUnit', 'defaultPrim',
+                  'startTimeCode', 'endTimeCode', 'timeCodesPerSecond', 'framesPerSecond')
+
+
+def create_root_layer(layer, suffix):
+    """Creates layer with stage metadata of the layer"""
+    root_layer = Sdf.Layer.CreateAnonymous(suffix)
+    for key in STAGE_METADATA:
+        if layer.pseudoRoot.HasInfo(key):
+            root_layer.pseudoRoot.SetInfo(key, layer.pseudoRoot.GetInfo(key))
+
+    return root_layer
+
+
+def get_parts_dir(usd_path: Path):
+    return usd_path.with_name(usd_path.stem)
+
+
+def reanchor_asset_path(asset_path):
+    """Anchored asset paths are relative to the root layer, part layers are one directory below it"""
+    if asset_path.startswith('./'):
+        return f"../{asset_path[2:]}"
+
+    if asset_path.startswith('../'):
+        return f"../{asset_path}"
+
+    return asset_path
+
+
+def split_layer(layer, root_prim_path=""):
+    """
+    Splits layer to layers per top-level prim under root_prim_path.
+    Returns root layer, which contains ancestors of the top-level prims, and
+    list of (prim path, part name, part layer).
+    """
+    parent_path = Sdf.Path(root_prim_path) if root_prim_path else Sdf.Path.absoluteRootPath
+    root_layer = Sdf.Layer.CreateAnonymous(PART_FORMAT)
+
+    parent_spec = layer.GetPrimAtPath(parent_path)
+    if not parent_spec:
+        return root_layer, []
+
+    # ancestors are defined in the root layer without their children
+    for path in parent_path.GetPrefixes():
+        src_spec = layer.GetPrimAtPath(path)
+        prim_spec = Sdf.CreatePrimInLayer(root_layer, path)
+        prim_spec.specifier = src_spec.specifier
+        prim_spec.typeName = src_spec.typeName
+
+    parts = []
+    # name of the ancestors part is reserved
+    names = {ROOT_PART_NAME.lower()}
+    for prim_spec in parent_spec.nameChildren:
+        # part files shouldn't clash on case-insensitive file systems
+        name = prim_spec.name
+        index = 0
+        while name.lower() in names:
+            index += 1
+            name = f"{prim_spec.name}_{index}"
+        names.add(name.lower())
+
+        part_layer = Sdf.Layer.CreateAnonymous(PART_FORMAT)
+        Sdf.CreatePrimInLayer(part_layer, prim_spec.path)
+        Sdf.CopySpec(layer, prim_spec.path, part_layer, prim_spec.path)
+        UsdUtils.ModifyAssetPaths(part_layer, reanchor_asset_path)
+        parts.append((prim_spec.path, name, part_layer))
+
+    return root_layer, parts
+
+
+def write_split(writer, layer, usd_path: Path, root_prim_path, temp_dir=None,
+                overwrite_textures=False, world_digest=b"", verify_textures=False):
+    """
+    Writes layer as root layer at usd_path, which sublayers one file per top-level prim.
+    Only changed files are rewritten by writer. Returns {prim path: part file path}.
+    """
+    parts_dir = get_parts_dir(usd_path)
+    ancestors_layer, parts = split_layer(layer, root_prim_path)
+
+    root_layer = create_root_layer(layer, usd_path.suffix)
+    part_files = []
+    part_paths = {}
+    for prim_path, name, part_layer in parts:
+        part_path = parts_dir / f"{name}{PART_FORMAT}"
+        part_paths[prim_path] = part_path
+        part_files.append((part_layer, part_path,
+                           world_digest if prim_path == Sdf.Path("/World") else b""))
+
+    if root_prim_path:
+        part_files.append((ancestors_layer, parts_dir / f"{ROOT_PART_NAME}{PART_FORMAT}", b""))
+
+    for _, part_path, _ in part_files:
+        root_layer.subLayerPaths.append(f"./{parts_dir.name}/{part_path.name}")
+
+    written_paths = {part_path for _, part_path, _ in part_files}
+
+    def remove_stale_parts():
+        # is called in the writer thread, when root layer doesn't reference stale parts anymore
+        if not parts_dir.is_dir():
+            return
+
+        for path in parts_dir.glob(f"*{PART_FORMAT}"):
+            if path not in written_paths:
+                log("Removing part of deleted object", path)
+                path.unlink(missing_ok=True)
+
+    writer.write(root_layer, usd_path, temp_dir, overwrite_textures, parts=part_files,
+                 verify_textures=verify_textures, on_written=remove_stale_parts)
+
+    return part_paths
@@ -13,16 +13,29 @@
 # limitations under the License.
 # ********************************************************************
 from pathlib import Path
+import os
+import tempfile
 
 import bpy
-from pxr import Tf
-
+from pxr import Tf, Sdf, UsdUtils
+
+from .scheduler import LiveSyncScheduler
+from .updates import SyncUpdates, UpdateFilter
+from .incremental import IncrementalSync
+from .writer import LayerWriter
+from .layout import write_split
+from .telemetry import telemetry, TELEMETRY_FILE
+from . import staging
 from ..preferences import preferences
 
 from .. import logging
 log = logging.Log("rs.resolver")
 
 
+# textures exported by Blender are copied to the channel directory with the same relative path
+EXPORTED_TEXTURES_PREFIX = "./textures/"
+
+
 class Resolver:
     def __init__(self):
         self.is_connected = False
@@ -31,6 +44,11 @@ class Resolver:
             "RenderStudioNotice::WorkspaceConnectionChanged", self._connection_callback)
 
         self._is_depsgraph_update = False
+        self.scheduler = LiveSyncScheduler(self.sync_updates)
+        self.updates = SyncUpdates()
+        self.update_filter = UpdateFilter()
+        self.writer = LayerWriter()
+        self.incremental = IncrementalSync(self.writer)
 
     @property
     def is_live_sync(self):
@@ -65,19 +83,55 @@ class Resolver:
             self.stop_live_sync()
 
         log("Disconnecting")
+        self.writer.flush()
+        self.writer.clear_digests()
+        staging.clear()
         RenderStudioKit.SharedWorkspaceDisconnect()
         self.filename = ""
         log.info("Disconnected")
 
     def start_live_sync(self):
         log("Start live sync")
+        self.scheduler.reset_stats()
+        self.writer.reset_stats()
+        telemetry.reset()
+        staging.stats.clear()
+        self.updates = SyncUpdates()
+        self.update_filter.reset(bpy.context.scene)
         bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update_post)
 
     def stop_live_sync(self):
         log("Stop live sync")
         bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update_post)
+        self.scheduler.cancel()
+
+    def request_sync(self, depsgraph):
+        if self._is_depsgraph_update:
+            self.scheduler.drop()
+            return
+
+        settings = bpy.context.scene.hydra_rpr.render_studio
+        updates = self.update_filter.filter(depsgraph, settings)
+        if not updates:
+            return
+
+        self.updates.add(updates)
+        self.scheduler.request(settings.sync_delay, settings.sync_max_latency, settings.sync_duty_cycle)
+
+    def request_world_sync(self):
+        """Requests sync of World, e.g. when full resolution World texture is staged after its proxy"""
+        settings = bpy.context.scene.hydra_rpr.render_studio
+        if not self.is_connected or not settings.live_sync:
+            return
+
+        self.updates.world = True
+        self.scheduler.request(0.0, 0.0, settings.sync_duty_cycle)
 
-    def sync_scene(self):
+    def sync_updates(self):
+        updates, self.updates = self.updates, SyncUpdates()
+        self.sync_scene(updates)
+
+    def sync_scene(self, updates=None):
         if self._is_depsgraph_update:
             return
 
@@ -91,33 +145,107 @@ class Resolver:
         usd_path = Path(RenderStudioKit.GetWorkspacePath()) / settings.channel / self.filename
 
         log("Syncing scene", usd_path)
+        telemetry.file_path = TELEMETRY_FILE if pref.rs_telemetry_file else None
         self._is_depsgraph_update = True
+        try:
+            with telemetry.sync(settings.sync_mode):
+                if settings.sync_mode == 'INCREMENTAL':
+                    self.incremental.sync(usd_path, self.export, get_export_settings(settings), updates)
+                else:
+                    self.export(usd_path)
+
+        finally:
+            self._is_depsgraph_update = False
+
+    def export(self, usd_path, export_world=True):
+        """
+        Exports scene to the temporary file and queues writing of it to usd_path.
+        Returns exported layer and {prim path: file path} of per object layout parts.
+        """
+        settings = bpy.context.scene.hydra_rpr.render_studio
+
+        # Blender exports the scene to the local temporary file in the format of the channel file,
+        # so that it could be written without serialization
+        temp_dir = Path(tempfile.mkdtemp(prefix="hydrarpr_"))
+        temp_path = temp_dir / usd_path.name
+
+        USDSyncHook.export_world = export_world and settings.export_world
         USDSyncHook.enable()
         try:
-            bpy.ops.wm.usd_export(
-                filepath=str(usd_path),
-                selected_objects_only=settings.selected_objects_only,
-                visible_objects_only=settings.visible_objects_only,
-                export_animation=settings.export_animation,
-                export_hair=settings.export_hair,
-                export_normals=settings.export_normals,
-                export_materials=settings.export_materials,
-                use_instancing=settings.use_instancing,
-                evaluation_mode=settings.evaluation_mode,
-                generate_preview_surface=settings.generate_preview_surface,
-                export_textures=settings.export_textures,
-                overwrite_textures=settings.overwrite_textures,
-                root_prim_path=settings.root_prim_path,
-            )
+            with telemetry.phase("usd_export"):
+                bpy.ops.wm.usd_export(filepath=str(temp_path), **get_export_settings(settings))
         finally:
             USDSyncHook.disable()
-            self._is_depsgraph_update = False
+
+        from . import world
+
+        layer = Sdf.Layer.OpenAsAnonymous(str(temp_path))
+        is_rebased = rebase_asset_paths(layer, temp_dir, usd_path.parent)
+        world_digest = world.get_textures_digest() if USDSyncHook.export_world else b""
+        if settings.channel_layout == 'PER_OBJECT':
+            parts = write_split(self.writer, layer, usd_path, settings.root_prim_path, temp_dir,
+                                settings.overwrite_textures, world_digest, settings.verify_textures)
+            return layer, parts
+
+        # exported file is written as is, pxr serialization would hold GIL in the writer thread
+        src = layer if is_rebased else temp_path
+        self.writer.write(src, usd_path, temp_dir, settings.overwrite_textures, world_digest,
+                          verify_textures=settings.verify_textures)
+        return layer, {}
+
+
+def rebase_asset_paths(layer, src_dir: Path, dst_dir: Path):
+    """
+    Rebases relative asset paths of layer exported to src_dir, e.g. paths to image files, when
+    textures aren't exported, to dst_dir. Returns True if any asset path is changed.
+    """
+    is_rebased = False
+
+    def rebase(asset_path):
+        nonlocal is_rebased
+        if not asset_path.startswith(('./', '../')) or asset_path.startswith(EXPORTED_TEXTURES_PREFIX):
+            return asset_path
+
+        path = os.path.normpath(src_dir / asset_path)
+        try:
+            path = Path(os.path.relpath(path, dst_dir)).as_posix()
+            path = path if path.startswith('../') else f"./{path}"
+
+        except ValueError:
+            # paths are on different drives
+            path = Path(path).as_posix()
+
+        is_rebased = True
+        return path
+
+    UsdUtils.ModifyAssetPaths(layer, rebase)
+    return is_rebased
+
+
+def get_export_settings(settings):
+    """Returns Blender Usd export settings"""
+    return {
+        'selected_objects_only': settings.selected_objects_only,
+        'visible_objects_only': settings.visible_objects_only,
+        'export_animation': settings.export_animation,
+        'export_hair': settings.export_hair,
+        'export_normals': settings.export_normals,
+        'export_materials': settings.export_materials,
+        'use_instancing': settings.use_instancing,
+        'evaluation_mode': settings.evaluation_mode,
+        'generate_preview_surface': settings.generate_preview_surface,
+        'export_textures': settings.export_textures,
+        'overwrite_textures': settings.overwrite_textures,
+        'root_prim_path': settings.root_prim_path,
+    }
 
 
 class USDSyncHook(bpy.types.USDHook):
     bl_idname = "usd_sync_hook"
     bl_label = "USD Sync Hook"
 
+    export_world = True
+
     @staticmethod
     def on_export(export_context):
         stage = export_context.get_stage()
@@ -125,15 +253,16 @@ class USDSyncHook(bpy.types.USDHook):
             return False
 
         from . import world
-        settings = bpy.context.scene.hydra_rpr.render_studio
-        try:
-            log("Exporting World")
-            if settings.export_world:
-                world.sync(stage, export_context.get_depsgraph())
+        # Blender checks number of arguments of hook functions, so it isn't decorated
+        with telemetry.phase("on_export"):
+            try:
+                log("Exporting World")
+                if USDSyncHook.export_world:
+                    world.sync(stage, export_context.get_depsgraph())
 
-        except Exception as err:
-            log.error("Can't sync World", err)
-            return False
+            except Exception as err:
+                log.error("Can't sync World", err)
+                return False
 
         return True
 
@@ -150,4 +279,4 @@ rs_resolver = Resolver()
 
 
 def on_depsgraph_update_post(scene, depsgraph):
-    rs_resolver.sync_scene()
+    rs_resolver.request_sync(depsgraph)
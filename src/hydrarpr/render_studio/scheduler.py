@@ -0,0 +1,118 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+import contextlib
+import time
+
+import bpy
+
+from .. import logging
+log = logging.Log("rs.scheduler")
+
+
+COST_SMOOTHING = 0.3    # weight of the last sync duration in the moving average
+
+
+class LiveSyncScheduler:
+    """
+    Collapses bursts of sync requests into a single call of sync_func.
+    Sync is executed when no new requests came during the quiet period (delay),
+    but not later than max_latency after the first request of the burst.
+    Pause between syncs is adapted to the average sync duration, so that live sync
+    takes not more than duty_cycle share of time.
+    """
+
+    def __init__(self, sync_func):
+        self.sync_func = sync_func
+
+        self.delay = 0.0
+        self.max_latency = 0.0
+        self.duty_cycle = 1.0
+        self.cost = 0.0
+        self._first_request_time = 0.0
+        self._last_request_time = 0.0
+        self._last_sync_end_time = 0.0
+
+        # bpy.app.timers identifies timers by function object, so keep one bound method
+        self._timer = self._on_timer
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.executed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.cost = 0.0
+
+    @property
+    def is_pending(self):
+        return bpy.app.timers.is_registered(self._timer)
+
+    @property
+    def min_interval(self):
+        """Minimum pause between the end of sync and the start of the next one"""
+        return self.cost * (1.0 - self.duty_cycle) / self.duty_cycle
+
+    def request(self, delay, max_latency, duty_cycle=1.0):
+        now = time.perf_counter()
+        self.delay = delay
+        self.max_latency = max(max_latency, delay)
+        self.duty_cycle = duty_cycle
+        self._last_request_time = now
+
+        if self.is_pending:
+            self.coalesced += 1
+            return
+
+        self._first_request_time = now
+        bpy.app.timers.register(self._timer, first_interval=max(delay, self._get_pause_left(now)))
+
+    def drop(self):
+        self.dropped += 1
+
+    def cancel(self):
+        if self.is_pending:
+            bpy.app.timers.unregister(self._timer)
+
+    def _get_pause_left(self, now):
+        return self._last_sync_end_time + self.min_interval - now
+
+    def _on_timer(self):
+        now = time.perf_counter()
+        quiet_left = self._last_request_time + self.delay - now
+        latency_left = self._first_request_time + self.max_latency - now
+        wait = min(quiet_left, latency_left) if quiet_left > 0.0 and latency_left > 0.0 else 0.0
+        # max latency can't override the sync load limit
+        wait = max(wait, self._get_pause_left(now))
+        if wait > 0.0:
+            return wait
+
+        log("Executing sync", self.coalesced, self.dropped, self.executed)
+        self.executed += 1
+
+        # timers are executed without window in context, which is required by export operator.
+        # There are no windows in background mode
+        windows = bpy.context.window_manager.windows
+        context = bpy.context.temp_override(window=windows[0]) if windows else contextlib.nullcontext()
+        try:
+            with context:
+                self.sync_func()
+
+        finally:
+            self._last_sync_end_time = time.perf_counter()
+            duration = self._last_sync_end_time - now
+            self.cost = duration if self.executed == 1 else \
+                self.cost + COST_SMOOTHING * (duration - self.cost)
+
+        return None
@@ -0,0 +1,176 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from pathlib import Path
+import hashlib
+import os
+import shutil
+import threading
+
+from .. import logging
+log = logging.Log("rs.staging")
+
+
+FICLONE = 0x40049409    # Linux ioctl, which clones file extents on copy-on-write file systems
+HASH_CHUNK_SIZE = 1 << 20
+
+# files staged during the session: destination path -> (source stat, destination stat)
+manifest = {}
+stats = Counter()
+# reentrant, because done callback of the cancelled task is called by cancel() under the lock
+_lock = threading.RLock()
+
+# background staging tasks: destination path -> future
+_tasks = {}
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="RenderStudioStaging")
+
+
+def get_stat(path: Path):
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def get_file_digest(path: Path):
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open('rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.digest()
+
+
+def is_fresh(src: Path, dst: Path, use_hash=False):
+    """Checks if dst is the same file as src"""
+    if not dst.is_file():
+        return False
+
+    src_stat, dst_stat = get_stat(src), get_stat(dst)
+    with _lock:
+        if manifest.get(str(dst)) == (src_stat, dst_stat):
+            return True
+
+    if src_stat[0] != dst_stat[0]:
+        return False
+
+    # copy2 and links preserve modification time
+    if src_stat[1] != dst_stat[1] and not (use_hash and get_file_digest(src) == get_file_digest(dst)):
+        return False
+
+    with _lock:
+        manifest[str(dst)] = (src_stat, dst_stat)
+    return True
+
+
+def reflink(src: Path, dst: Path):
+    import fcntl
+
+    with src.open('rb') as src_file, dst.open('wb') as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+
+    shutil.copystat(src, dst)
+
+
+def stage_file(src: Path, dst: Path, use_hash=False):
+    """
+    Stages src file to dst if dst is missing or differs from src. Tries to make hard link
+    or reflink and falls back to copying. Returns True if file was staged.
+    """
+    if is_fresh(src, dst, use_hash):
+        stats['fresh'] += 1
+        return False
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    remove_file(dst)
+
+    try:
+        os.link(src, dst)
+        method = 'linked'
+
+    except OSError:
+        try:
+            reflink(src, dst)
+            method = 'reflinked'
+
+        except (OSError, ImportError):
+            remove_file(dst)
+            shutil.copy2(src, dst)
+            method = 'copied'
+
+    log("File is staged", src, dst, method)
+    stats[method] += 1
+    with _lock:
+        manifest[str(dst)] = (get_stat(src), get_stat(dst))
+    return True
+
+
+def remove_file(path: Path):
+    """
+    Removes staged file. It has to be done before overwriting of the file,
+    because the file could be a hard link to the source file.
+    """
+    path.unlink(missing_ok=True)
+    with _lock:
+        manifest.pop(str(path), None)
+
+
+def submit(dst: Path, func, *args, deferred=False):
+    """
+    Runs func(*args), which stages dst, in the background thread.
+    Not started task for the same dst is superseded. Deferred tasks aren't waited by wait().
+    """
+    with _lock:
+        old_task = _tasks.get(str(dst))
+        if old_task and old_task[0].cancel():
+            log("Staging is superseded", dst)
+
+        task = _executor.submit(func, *args)
+        _tasks[str(dst)] = (task, deferred)
+
+    task.add_done_callback(lambda task: _on_task_done(dst, task))
+
+
+def _on_task_done(dst: Path, task):
+    with _lock:
+        if str(dst) in _tasks and _tasks[str(dst)][0] is task:
+            del _tasks[str(dst)]
+
+    if not task.cancelled() and task.exception():
+        log.error("Can't stage file", dst, task.exception())
+
+
+def is_pending(dst: Path):
+    with _lock:
+        return str(dst) in _tasks
+
+
+def is_staged(dst: Path):
+    """Checks if dst was staged during the session"""
+    with _lock:
+        return str(dst) in manifest
+
+
+def wait():
+    """Waits until all not deferred background staging tasks are finished"""
+    with _lock:
+        tasks = [task for task, deferred in _tasks.values() if not deferred]
+
+    wait_futures(tasks)
+
+
+def clear():
+    with _lock:
+        manifest.clear()
+    stats.clear()
@@ -0,0 +1,156 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+import json
+import math
+import threading
+import time
+
+from .. import logging
+log = logging.Log("rs.telemetry")
+
+
+WINDOW = 100    # number of last samples used for percentiles
+TELEMETRY_FILE = Path(logging.__file__).parent / 'hydrarpr_telemetry.jsonl'
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values"""
+    return values[max(0, math.ceil(p / 100.0 * len(values)) - 1)]
+
+
+def summary(values):
+    """Returns (p50, p95, max) of values"""
+    values = sorted(values)
+    return percentile(values, 50), percentile(values, 95), values[-1]
+
+
+class RollingStats:
+    def __init__(self):
+        self.samples = deque(maxlen=WINDOW)
+        self.count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+    def summary(self):
+        return summary(self.samples)
+
+
+class SyncTelemetry:
+    """
+    Collects durations of sync phases and bytes written per sync. Phases are timed
+    both in main and writer threads, durations of the same phase during one sync are summed.
+    """
+
+    def __init__(self):
+        self.file_path = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = OrderedDict()
+            self.sync_id = 0
+            self._sync = None
+            self._sync_bytes = OrderedDict()
+
+    @contextmanager
+    def sync(self, mode):
+        """Times the whole sync, writes its phases to telemetry file"""
+        self.sync_id += 1
+        self._sync = {'sync': self.sync_id, 'mode': mode, 'time': time.time(), 'phases': {}}
+        try:
+            with self.phase("sync"):
+                yield
+
+        finally:
+            record, self._sync = self._sync, None
+            self._write_record(record)
+
+    @contextmanager
+    def phase(self, name, sync_id=None):
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.add_phase(name, time.perf_counter() - start, sync_id)
+
+    def timed(self, name):
+        """Decorator, which times calls of the function as the phase"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def add_phase(self, name, duration, sync_id=None):
+        with self._lock:
+            stats = self.phases.get(name)
+            if not stats:
+                stats = self.phases[name] = RollingStats()
+            stats.add(duration)
+
+        record = self._sync
+        if sync_id is None and record:
+            record['phases'][name] = record['phases'].get(name, 0.0) + duration
+
+    def add_written(self, sync_id, duration, size):
+        """Is called by writer thread after writing of files queued by the sync"""
+        self.add_phase("write", duration, sync_id)
+        with self._lock:
+            if sync_id not in self._sync_bytes:
+                while len(self._sync_bytes) >= WINDOW:
+                    self._sync_bytes.popitem(last=False)
+                self._sync_bytes[sync_id] = 0
+            self._sync_bytes[sync_id] += size
+
+        self._write_record({'sync': sync_id, 'time': time.time(), 'write': duration, 'bytes': size})
+
+    def phase_summaries(self):
+        """Returns list of (phase name, number of calls, (p50, p95, max) of durations)"""
+        with self._lock:
+            return [(name, stats.count, stats.summary()) for name, stats in self.phases.items()]
+
+    def bytes_summary(self):
+        """Returns (p50, p95, max) of bytes written per sync or None"""
+        with self._lock:
+            values = list(self._sync_bytes.values())
+
+        return summary(values) if values else None
+
+    def _write_record(self, record):
+        file_path = self.file_path
+        if not file_path:
+            return
+
+        try:
+            with self._lock, file_path.open('a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+
+        except OSError as err:
+            log.warn("Can't write telemetry", file_path, err)
+
+
+telemetry = SyncTelemetry()
@@ -15,10 +15,15 @@
 import bpy
 
 from .resolver import rs_resolver
+from .telemetry import telemetry
+from . import staging
 from ..preferences import preferences
 from ..ui import Panel
 
 
+WRITE_REDRAW_INTERVAL = 0.2  # seconds
+
+
 class RS_RESOLVER_PT_resolver(Panel):
     bl_idname = 'RS_RESOLVER_PT_resolver'
     bl_label = "AMD RenderStudio"
@@ -44,6 +49,8 @@ class RS_RESOLVER_PT_resolver(Panel):
             #     col.label(text="Workspace Dir is required, check Addon Preferences", icon="ERROR")
 
         layout.prop(settings, "channel")
+        layout.prop(settings, "sync_mode")
+        layout.prop(settings, "channel_layout")
         layout.separator()
 
         col = layout.column(align=True)
@@ -60,11 +67,45 @@ class RS_RESOLVER_PT_resolver(Panel):
         row.use_property_split = False
         row.prop(settings, "live_sync")
 
+        if settings.live_sync:
+            col = layout.column(align=True)
+            col.prop(settings, "sync_delay")
+            col.prop(settings, "sync_max_latency")
+            col.prop(settings, "sync_duty_cycle")
+
+        if rs_resolver.is_live_sync:
+            scheduler = rs_resolver.scheduler
+            col = layout.box().column(align=True)
+            col.label(text=f"Executed: {scheduler.executed}")
+            col.label(text=f"Coalesced: {scheduler.coalesced}")
+            col.label(text=f"Dropped: {scheduler.dropped}")
+            if scheduler.executed:
+                col.label(text=f"Sync time: {scheduler.cost * 1000:.0f} ms, "
+                               f"min pause: {scheduler.min_interval * 1000:.0f} ms")
+
+            update_filter = rs_resolver.update_filter
+            filtered = sum(update_filter.filtered.values())
+            col.label(text=f"Filtered updates: {filtered} of {update_filter.received}")
+            for reason, count in update_filter.filtered.most_common():
+                col.label(text=f"    {reason}: {count}")
+
         if rs_resolver.filename:
             col = layout.box().column(align=True)
             col.label(text="Syncing to:")
             col.label(text=f"{settings.channel}/{rs_resolver.filename}")
 
+            writer = rs_resolver.writer
+            if writer.is_busy:
+                if writer.in_flight:
+                    col.label(text=f"Writing: {writer.in_flight.name}", icon='FILE_REFRESH')
+                col.label(text=f"Pending writes: {writer.pending}")
+
+                if not bpy.app.timers.is_registered(redraw_while_writing):
+                    bpy.app.timers.register(redraw_while_writing, first_interval=WRITE_REDRAW_INTERVAL)
+
+            if writer.written or writer.skipped:
+                col.label(text=f"Written: {writer.written}, Unchanged: {writer.skipped}")
+
 
 class RS_RESOLVER_PT_usd_settings(Panel):
     bl_parent_id = RS_RESOLVER_PT_resolver.bl_idname
@@ -87,6 +128,15 @@ class RS_RESOLVER_PT_usd_settings(Panel):
         col.prop(settings, "export_animation")
         col.prop(settings, "export_hair")
         col.prop(settings, "export_world")
+        row = col.row()
+        row.enabled = settings.export_world
+        row.prop(settings, "progressive_world")
+        row = col.row()
+        row.enabled = settings.export_world
+        row.prop(settings, "bake_world")
+        row = col.row()
+        row.enabled = settings.export_world and settings.bake_world
+        row.prop(settings, "bake_world_resolution")
         col.prop(settings, "use_instancing")
 
         col = layout.column(align=True)
@@ -100,12 +150,43 @@ class RS_RESOLVER_PT_usd_settings(Panel):
         col1.prop(settings, "generate_preview_surface")
         col1.prop(settings, "export_textures")
         col1.prop(settings, "overwrite_textures")
+        col1.prop(settings, "verify_textures")
 
         col = layout.column()
         col.prop(settings, "root_prim_path")
         col.prop(settings, "evaluation_mode")
 
 
+class RS_RESOLVER_PT_statistics(Panel):
+    bl_parent_id = RS_RESOLVER_PT_resolver.bl_idname
+    bl_label = "Sync Statistics"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+
+        phases = telemetry.phase_summaries()
+        if not phases:
+            layout.label(text="No syncs yet")
+            return
+
+        col = layout.column(align=True)
+        col.label(text="Phase: p50 / p95 / max, ms")
+        for name, count, (p50, p95, max_time) in phases:
+            col.label(text=f"{name} ({count}): {p50 * 1000:.1f} / {p95 * 1000:.1f} / {max_time * 1000:.1f}")
+
+        bytes_summary = telemetry.bytes_summary()
+        if bytes_summary:
+            p50, p95, max_size = (size / 1024 for size in bytes_summary)
+            col.separator()
+            col.label(text=f"Written per sync, KB: {p50:.1f} / {p95:.1f} / {max_size:.1f}")
+
+        if staging.stats:
+            col.separator()
+            col.label(text="Textures: " + ", ".join(f"{method} {count}"
+                                                   for method, count in sorted(staging.stats.items())))
+
+
 def tag_redraw():
     for window in bpy.context.window_manager.windows:
         for area in window.screen.areas:
@@ -115,7 +196,13 @@ def tag_redraw():
                         region.tag_redraw()
 
 
+def redraw_while_writing():
+    tag_redraw()
+    return WRITE_REDRAW_INTERVAL if rs_resolver.writer.is_busy else None
+
+
 register, unregister = bpy.utils.register_classes_factory((
     RS_RESOLVER_PT_resolver,
     RS_RESOLVER_PT_usd_settings,
+    RS_RESOLVER_PT_statistics,
 ))
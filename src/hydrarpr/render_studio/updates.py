@@ -0,0 +1,174 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+from collections import Counter
+
+import bpy
+
+
+# Updates of these IDs are reported through their owners: object data and node trees
+OWNED_ID_TYPES = (
+    bpy.types.Mesh,
+    bpy.types.NodeTree,
+)
+
+# These IDs aren't exported to Usd
+NOT_EXPORTED_ID_TYPES = (
+    bpy.types.Brush,
+    bpy.types.Palette,
+    bpy.types.Text,
+)
+
+
+def get_settings_key(settings):
+    return tuple(getattr(settings, prop.identifier) for prop in settings.bl_rna.properties
+                 if prop.identifier != 'rna_type')
+
+
+def get_scene_key(scene: bpy.types.Scene):
+    """Returns scene properties, which affect export besides objects"""
+    world_name = scene.world.name_full if scene.world else None
+    camera_name = scene.camera.name_full if scene.camera else None
+    view_layer = bpy.context.view_layer
+    return (world_name, camera_name, view_layer.name if view_layer else None,
+            scene.frame_start, scene.frame_end, scene.frame_step, scene.render.fps, scene.render.fps_base,
+            scene.unit_settings.system, scene.unit_settings.scale_length)
+
+
+def get_object_state(obj: bpy.types.Object):
+    """Returns (exported state, selection state) of object"""
+    view_layer = bpy.context.view_layer
+    is_active = bool(view_layer) and view_layer.objects.active == obj
+    return (obj.name_full, obj.hide_viewport, obj.hide_render, obj.hide_get(), obj.visible_get()), \
+        (obj.select_get(), is_active)
+
+
+class UpdateFilter:
+    """
+    Drops depsgraph updates, which can't change the exported Usd with current settings:
+    selection and active object changes, UI property changes and so on.
+    """
+
+    def __init__(self):
+        self.scene_key = None
+        self.settings_key = None
+        # object pointer -> state of get_object_state()
+        self.object_states = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.received = 0
+        self.filtered = Counter()
+
+    def reset(self, scene):
+        self.scene_key = get_scene_key(scene)
+        self.settings_key = get_settings_key(scene.hydra_rpr.render_studio)
+        self.object_states = {obj.as_pointer(): get_object_state(obj) for obj in scene.objects}
+        self.reset_stats()
+
+    def filter(self, depsgraph, settings):
+        """Returns list of updates, which are relevant for sync"""
+        updates = []
+        for update in depsgraph.updates:
+            self.received += 1
+            reason = self._get_filter_reason(update, settings)
+            if reason:
+                self.filtered[reason] += 1
+            else:
+                updates.append(update)
+
+        return updates
+
+    def _get_filter_reason(self, update, settings):
+        id = update.id.original
+        if isinstance(id, bpy.types.Object):
+            key = id.as_pointer()
+            old_state = self.object_states.get(key)
+            state = self.object_states[key] = get_object_state(id)
+            if update.is_updated_transform or update.is_updated_geometry or update.is_updated_shading:
+                return None
+
+            # renames and visibility changes affect export, unknown changes are synced
+            if not old_state or old_state[0] != state[0] or old_state[1] == state[1]:
+                return None
+
+            # selection and active object changes affect only export of selected objects
+            return None if settings.selected_objects_only else "Selection"
+
+        if isinstance(id, bpy.types.Scene):
+            scene_key = get_scene_key(id)
+            if scene_key != self.scene_key:
+                self.scene_key = scene_key
+                return None
+
+            # changes of Render Studio settings are reported as scene updates
+            settings_key = get_settings_key(settings)
+            if settings_key != self.settings_key:
+                self.settings_key = settings_key
+                return None
+
+            return None if settings.selected_objects_only else "Scene"
+
+        if isinstance(id, bpy.types.World):
+            return None if settings.export_world else "World"
+
+        if isinstance(id, OWNED_ID_TYPES):
+            return "Owned data"
+
+        if isinstance(id, NOT_EXPORTED_ID_TYPES):
+            return "Not exported"
+
+        return None
+
+
+class SyncUpdates:
+    """Accumulates depsgraph updates between syncs"""
+
+    def __init__(self):
+        self.transform = set()
+        self.geometry = set()
+        self.world = False
+        # scene structure could be changed, it is checked by comparing of exported objects
+        self.structure = False
+        self.full = False
+
+    def __bool__(self):
+        return bool(self.transform or self.geometry or self.world or self.structure or self.full)
+
+    @property
+    def is_transform_only(self):
+        return bool(self.transform) and not (self.geometry or self.world or self.structure or self.full)
+
+    def add(self, updates):
+        for update in updates:
+            id = update.id
+            if isinstance(id, bpy.types.Object):
+                if update.is_updated_transform:
+                    self.transform.add(id.name)
+                if update.is_updated_geometry:
+                    self.geometry.add(id.name)
+                if update.is_updated_shading:
+                    self.full = True
+                if not (update.is_updated_transform or update.is_updated_geometry or
+                        update.is_updated_shading):
+                    self.structure = True
+
+            elif isinstance(id, bpy.types.World):
+                self.world = True
+
+            elif isinstance(id, (bpy.types.Scene, bpy.types.Collection)):
+                self.structure = True
+
+            else:
+                self.full = True
@@ -13,11 +13,14 @@
 # limitations under the License.
 # ********************************************************************
 from pathlib import Path
-import shutil
 
 import bpy
 from pxr import Sdf, UsdLux
 
+from ..telemetry import telemetry
+from .. import staging
+from . import image_cache
+from .fingerprint import get_world_fingerprint
 from ...preferences import preferences
 
 from ... import logging
@@ -30,7 +33,28 @@ BLENDER_DEFAULT_FORMAT = "HDR"
 BLENDER_DEFAULT_COLOR_MODE = "RGB"
 READONLY_IMAGE_FORMATS = {".dds"}  # blender can read these formats, but can't write
 
+# world textures staged during the last sync: file path -> (size, mtime) or content digest
+staged_textures = {}
+# full resolution world textures staged in the background, which are replaced by proxies
+pending_textures = set()
+proxy_textures = set()
+PENDING_CHECK_INTERVAL = 0.5    # seconds
 
+# (world fingerprint, world data, staged textures) of the last parsed World
+world_data_cache = None
+
+
+def get_textures_digest():
+    """Returns bytes which identify staged world textures and their content"""
+    return repr(sorted(staged_textures.items())).encode()
+
+
+def add_staged_texture(filepath: Path):
+    stat = filepath.stat()
+    staged_textures[str(filepath)] = (stat.st_size, stat.st_mtime_ns)
+
+
+@telemetry.timed("get_world_data")
 def get_world_data(world: bpy.types.World):
     data = {'color': (0.05, 0.05, 0.05),
             'image': None,
@@ -49,10 +73,15 @@ def get_world_data(world: bpy.types.World):
     if not output_node:
         return data
 
-    from .nodes import ShaderNodeOutputWorld
+    if bpy.context.scene.hydra_rpr.render_studio.bake_world:
+        image = cache_baked_world(world, output_node)
+        if image:
+            data['image'] = image
+            return data
+
+    from . import compiler
 
-    node_parser = ShaderNodeOutputWorld(world, output_node)
-    node_item = node_parser.export()
+    node_item = compiler.evaluate(world, output_node)
     if not node_item:
         return data
 
@@ -95,13 +124,39 @@ def get_world_data(world: bpy.types.World):
     return data
 
 
+def get_cached_world_data(world: bpy.types.World):
+    """Returns world data, World is parsed and its textures are staged only if World is changed"""
+    global world_data_cache
+
+    settings = bpy.context.scene.hydra_rpr.render_studio
+    # staging settings and location of staged textures affect world data too
+    fingerprint = (get_world_fingerprint(world), preferences().rs_workspace_dir, settings.channel,
+                   settings.progressive_world, settings.verify_textures,
+                   settings.bake_world, settings.bake_world_resolution)
+
+    if world_data_cache and world_data_cache[0] == fingerprint:
+        _, data, textures = world_data_cache
+        # proxy has to be replaced with the full resolution texture
+        if not any(path in proxy_textures for path in textures) and \
+                all(Path(path).is_file() or staging.is_pending(Path(path)) for path in textures):
+            log("World is unchanged", world)
+            staged_textures.update(textures)
+            return data
+
+    data = get_world_data(world)
+    world_data_cache = (fingerprint, data, dict(staged_textures))
+    return data
+
+
 def sync(stage, depsgraph):
+    staged_textures.clear()
+
     world = depsgraph.scene.world
     if not world:
         log.warn("Scene doesn't contain World, nothing to export")
         return
 
-    data = get_world_data(world)
+    data = get_cached_world_data(world)
 
     obj_prim = stage.DefinePrim(stage.GetPseudoRoot().GetPath().AppendChild("World"))
     usd_light = UsdLux.DomeLight.Define(stage, obj_prim.GetPath().AppendChild("World"))
@@ -121,8 +176,10 @@ def sync(stage, depsgraph):
     usd_light.AddRotateYOp().Set(-90.0)
 
 
+@telemetry.timed("cache_image_file")
 def cache_image_file(image: bpy.types.Image):
-    root_dir = Path(preferences().rs_workspace_dir) / bpy.context.scene.hydra_rpr.render_studio.channel
+    settings = bpy.context.scene.hydra_rpr.render_studio
+    root_dir = Path(preferences().rs_workspace_dir) / settings.channel
     world_dir = root_dir / "textures/world"
     image_path = Path(image.filepath_from_user())
 
@@ -138,13 +195,83 @@ def cache_image_file(image: bpy.types.Image):
                 image_suffix in SUPPORTED_FORMATS and
                 f".{image.file_format.lower()}" in SUPPORTED_FORMATS and not image.is_dirty):
             filepath = world_dir / image_path.name
-            shutil.copy(image_path, filepath)
-            return filepath.relative_to(root_dir)
+            if not staging.is_pending(filepath) and \
+                    staging.is_fresh(image_path, filepath, settings.verify_textures):
+                add_staged_texture(filepath)
+                return filepath.relative_to(root_dir)
+
+            # readonly formats can't be proxied, proxy is encoded from pixels
+            proxy_path = get_proxy_path(filepath) \
+                if settings.progressive_world and image_suffix not in READONLY_IMAGE_FORMATS else None
+            staged_path, digest = image_cache.stage_in_background(
+                image, filepath, proxy_path, staging.get_stat(image_path),
+                staging.stage_file, image_path, filepath, settings.verify_textures)
+            return use_staged_file(staged_path, filepath, digest, root_dir)
 
     filename = image_path.stem if image_path.stem else image.name
     filename += DEFAULT_FORMAT
     filepath = world_dir / filename
 
+    proxy_path = get_proxy_path(filepath) if settings.progressive_world else None
+    staged_path, digest = image_cache.stage_converted(image, filepath, save_image, proxy_path)
+    if not staged_path:
+        return None
+
+    return use_staged_file(staged_path, filepath, digest, root_dir)
+
+
+def cache_baked_world(world: bpy.types.World, output_node: bpy.types.Node):
+    """Bakes procedural World to texture, returns its path or None if World doesn't need baking"""
+    from . import bake
+
+    settings = bpy.context.scene.hydra_rpr.render_studio
+    root_dir = Path(preferences().rs_workspace_dir) / settings.channel
+    filepath = root_dir / "textures/world" / f"{bpy.path.clean_name(world.name)}.baked{DEFAULT_FORMAT}"
+
+    staged_path, digest = bake.stage_baked(world, output_node, int(settings.bake_world_resolution),
+                                           filepath)
+    if not staged_path:
+        return None
+
+    return use_staged_file(staged_path, filepath, digest, root_dir)
+
+
+def get_proxy_path(filepath: Path):
+    return filepath.with_name(f"{filepath.stem}.proxy{DEFAULT_FORMAT}")
+
+
+def use_staged_file(staged_path: Path, filepath: Path, digest, root_dir: Path):
+    """
+    Registers staged file and returns its path relative to root_dir. If staged_path is a proxy,
+    World is synced again when the full resolution file is staged.
+    """
+    # file could be still written in the background, so it is identified by its content
+    staged_textures[str(staged_path)] = digest
+    if staged_path != filepath:
+        proxy_textures.add(str(staged_path))
+        pending_textures.add(filepath)
+        if not bpy.app.timers.is_registered(check_pending_textures):
+            bpy.app.timers.register(check_pending_textures, first_interval=PENDING_CHECK_INTERVAL)
+
+    return staged_path.relative_to(root_dir)
+
+
+def check_pending_textures():
+    staged = {path for path in pending_textures if not staging.is_pending(path)}
+    if staged:
+        pending_textures.difference_update(staged)
+        if any(staging.is_staged(path) for path in staged):
+            log("Full resolution World textures are staged", staged)
+            from ..resolver import rs_resolver
+            rs_resolver.request_world_sync()
+        else:
+            log.warn("World textures aren't staged", staged)
+
+    return PENDING_CHECK_INTERVAL if pending_textures else None
+
+
+@telemetry.timed("save_image")
+def save_image(image: bpy.types.Image, filepath: Path):
     scene = bpy.context.scene
     user_format = scene.render.image_settings.file_format
     user_color_mode = scene.render.image_settings.color_mode
@@ -160,10 +287,10 @@ def cache_image_file(image: bpy.types.Image):
 
     except Exception as err:
         log.warn("Image isn't exported'", image, filepath, err)
-        return None
+        return False
 
     finally:
         scene.render.image_settings.file_format = user_format
         scene.render.image_settings.color_mode = user_color_mode
 
-    return filepath.relative_to(root_dir)
+    return True
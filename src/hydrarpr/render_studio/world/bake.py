@@ -0,0 +1,294 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+"""
+Baking of procedural World node tree to equirectangular texture. Node tree is evaluated
+by node parsers over grid of view directions with batched NodeItem, rows are evaluated by chunks.
+Texture uses Blender equirectangular mapping, so it is synced as Environment Texture image.
+"""
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import math
+
+import numpy as np
+
+import bpy
+
+from . import image_cache
+from .fingerprint import get_world_fingerprint
+from .node_parser import NodeItem
+from .. import staging
+from ..telemetry import telemetry
+from ...preferences import preferences
+
+from ... import logging
+log = logging.Log('export.world.bake')
+
+
+ROWS_PER_CHUNK = 64
+MAX_BAKES = 4
+
+# (world fingerprint, width) -> digest of baked texture or None if node tree doesn't need baking
+bakes = OrderedDict()
+
+
+def get_directions(width, height, row_start, row_end):
+    """Returns float32 array (rows, width, 3) of view directions of pixels, rows go from top to bottom"""
+    u = (np.arange(width, dtype=np.float32) + 0.5) / width
+    v = 1.0 - (np.arange(row_start, row_end, dtype=np.float32) + 0.5) / height
+
+    azimuth = (0.5 - u) * (2.0 * math.pi)
+    elevation = (v - 0.5) * math.pi
+
+    directions = np.empty((row_end - row_start, width, 3), dtype=np.float32)
+    cos_elevation = np.cos(elevation)[:, None]
+    directions[..., 0] = cos_elevation * np.cos(azimuth)
+    directions[..., 1] = cos_elevation * np.sin(azimuth)
+    directions[..., 2] = np.sin(elevation)[:, None]
+    return directions
+
+
+def get_equirect_uv(vector):
+    """Returns equirectangular (u, v) of direction array (..., 3)"""
+    x, y, z = np.moveaxis(vector[..., :3], -1, 0)
+    length = np.sqrt(x * x + y * y + z * z)
+    z = np.divide(z, length, out=np.zeros_like(z), where=length > 0.0)
+    return 0.5 - np.arctan2(y, x) / (2.0 * math.pi), 0.5 + np.arcsin(np.clip(z, -1.0, 1.0)) / math.pi
+
+
+def sample_bilinear(rgb, u, v):
+    """Samples (height, width, 3) array, which rows go from top to bottom, u is wrapped"""
+    height, width = rgb.shape[:2]
+    x = u * width - 0.5
+    y = (1.0 - v) * height - 0.5
+    x0, y0 = np.floor(x), np.floor(y)
+    fx, fy = (x - x0)[..., None], (y - y0)[..., None]
+
+    x0 = x0.astype(np.int64) % width
+    x1 = (x0 + 1) % width
+    y0 = y0.astype(np.int64)
+    y1 = np.clip(y0 + 1, 0, height - 1)
+    y0 = np.clip(y0, 0, height - 1)
+
+    top = rgb[y0, x0] * (1.0 - fx) + rgb[y0, x1] * fx
+    bottom = rgb[y1, x0] * (1.0 - fx) + rgb[y1, x1] * fx
+    return top * (1.0 - fy) + bottom * fy
+
+
+def get_sun_direction(node):
+    if node.sky_type == 'NISHITA':
+        elevation, rotation = node.sun_elevation, node.sun_rotation
+        return np.array((math.cos(elevation) * math.sin(rotation),
+                         math.cos(elevation) * math.cos(rotation),
+                         math.sin(elevation)), dtype=np.float32)
+
+    direction = np.array(node.sun_direction, dtype=np.float32)
+    return direction / max(float(np.linalg.norm(direction)), 1e-6)
+
+
+def get_sky(node, vector):
+    """
+    Returns radiance (..., 3) of Sky Texture node in directions vector. This is an approximation:
+    zenith to horizon gradient, which is tinted by sun elevation, with sun glow and sun disc.
+    """
+    length = np.maximum(np.linalg.norm(vector[..., :3], axis=-1, keepdims=True), 1e-6)
+    direction = vector[..., :3] / length
+    sun = get_sun_direction(node)
+    sun_height = float(sun[2])
+
+    if node.sky_type == 'NISHITA':
+        haze = 1.0 + node.dust_density * 0.5 + (node.air_density - 1.0) * 0.25
+        ground = np.array((0.02, 0.02, 0.02), dtype=np.float32)
+    else:
+        haze = max(node.turbidity, 1.0) / 2.0
+        ground = np.full(3, node.ground_albedo * 0.3, dtype=np.float32)
+
+    # sky gets darker and warmer when the sun goes down
+    daylight = float(np.clip(sun_height * 4.0 + 0.3, 0.02, 1.0))
+    sunset = float(np.clip(1.0 - sun_height * 3.0, 0.0, 1.0))
+    zenith = np.array((0.2, 0.4, 1.0), dtype=np.float32) * (1.0 / haze ** 0.5)
+    horizon = np.array((0.8, 0.85, 1.0), dtype=np.float32) * (1.0 - sunset) + \
+        np.array((1.0, 0.55, 0.3), dtype=np.float32) * sunset
+
+    height = direction[..., 2:3]
+    t = np.sqrt(np.clip(height, 0.0, 1.0))
+    sky = (horizon * (1.0 - t) + zenith * t) * daylight
+    sky = np.where(height >= 0.0, sky, ground * daylight)
+
+    cos_angle = np.clip(direction @ sun, -1.0, 1.0)[..., None]
+    sun_color = np.array((1.0, 0.9, 0.8), dtype=np.float32) * (1.0 - sunset * 0.5)
+    sky = sky + sun_color * np.exp((cos_angle - 1.0) * 50.0 / haze) * 0.5 * daylight
+
+    if node.sky_type != 'NISHITA' or node.sun_disc:
+        sun_size = node.sun_size if node.sky_type == 'NISHITA' else math.radians(0.545)
+        sun_intensity = node.sun_intensity if node.sky_type == 'NISHITA' else 1.0
+        is_disc = (cos_angle >= math.cos(sun_size * 0.5)) & (height >= 0.0)
+        sky = np.where(is_disc, sky + sun_color * (100.0 * sun_intensity), sky)
+
+    return sky.astype(np.float32)
+
+
+class BakeContext:
+    """Bake state of a chunk of rows, is passed to node parsers in 'bake' argument"""
+
+    def __init__(self, directions, images):
+        self.directions = NodeItem(directions, 3)
+        # linear pixels of looked up images shared by all chunks: image name -> array or None
+        self.images = images
+
+    def sample_image(self, image: bpy.types.Image, vector: NodeItem = None):
+        """Returns batched NodeItem of image color in directions of vector or view directions"""
+        if image.name_full not in self.images:
+            self.images[image.name_full] = self.get_image_rgb(image)
+
+        rgb = self.images[image.name_full]
+        if rgb is None:
+            return NodeItem(np.zeros_like(self.directions.value), 3)
+
+        if vector is None or not vector.channels:
+            vector = self.directions
+
+        u, v = get_equirect_uv(vector.value)
+        return NodeItem(sample_bilinear(rgb, u, v).astype(np.float32), 3)
+
+    @staticmethod
+    def get_image_rgb(image: bpy.types.Image):
+        pixels = image_cache.get_pixels(image)
+        if pixels is None:
+            log.warn("Image has no pixels", image)
+            return None
+
+        rgb = image_cache.get_linear_rgb(image, pixels)
+        if rgb is None:
+            log.warn("Image colorspace isn't supported by baking, image is used as linear", image)
+            rgb = np.repeat(pixels[::-1, :, :1], 3, axis=-1) if image.channels < 3 \
+                else pixels[::-1, :, :3]
+
+        return np.ascontiguousarray(rgb)
+
+
+def to_rgb(value, context: BakeContext):
+    """Returns (rows, width, 3) array of float, color, batched grid or image data"""
+    if isinstance(value, dict):
+        if not value.get('image'):
+            return np.zeros_like(context.directions.value)
+
+        value = context.sample_image(value['image'], value.get('vector')).value
+
+    value = np.asarray(value, dtype=np.float32)
+    if value.ndim in (0, 2):
+        # float or grid of floats
+        value = value[..., None]
+
+    return np.broadcast_to(value[..., :3], context.directions.value.shape)
+
+
+def is_batched(value):
+    return isinstance(value, np.ndarray) and value.ndim >= 2
+
+
+def evaluate_chunk(world, output_node, context: BakeContext):
+    """
+    Returns radiance (rows, width, 3) of World output in the chunk of directions or None
+    if it doesn't depend on view direction.
+    """
+    from .nodes import ShaderNodeOutputWorld
+
+    node_item = ShaderNodeOutputWorld(world, output_node, bake=context).export()
+    if not node_item:
+        return None
+
+    data = node_item.data
+    if isinstance(data, dict) and 'intensity' in data:
+        color, intensity = data.get('color'), data['intensity']
+        if isinstance(color, dict) and color.get('image') and not is_batched(intensity):
+            # Environment texture with uniform strength is synced as is
+            return None
+
+        if not is_batched(color) and not is_batched(intensity):
+            return None
+
+        return to_rgb(color, context) * to_rgb(intensity, context)
+
+    return to_rgb(data, context) if is_batched(data) else None
+
+
+@telemetry.timed("bake_world")
+def bake(world: bpy.types.World, output_node: bpy.types.Node, width):
+    """Returns float32 array (width / 2, width, 3) of baked World or None if World doesn't need baking"""
+    height = width // 2
+    images = {}
+    rgb = None
+    for row_start in range(0, height, ROWS_PER_CHUNK):
+        row_end = min(row_start + ROWS_PER_CHUNK, height)
+        context = BakeContext(get_directions(width, height, row_start, row_end), images)
+        chunk = evaluate_chunk(world, output_node, context)
+        if chunk is None:
+            return None
+
+        if rgb is None:
+            rgb = np.empty((height, width, 3), dtype=np.float32)
+
+        rgb[row_start:row_end] = chunk
+
+    return rgb
+
+
+def stage_baked(world: bpy.types.World, output_node: bpy.types.Node, width, dst: Path):
+    """
+    Bakes World and stages baked texture to dst in the background. World isn't baked again
+    if its node tree is unchanged and baked texture is still in the image cache.
+    Returns (path, digest) of the staged file or (None, None) if World doesn't need baking.
+    """
+    key = (get_world_fingerprint(world), width)
+    if key in bakes:
+        bakes.move_to_end(key)
+        digest = bakes[key]
+        if digest is None:
+            return None, None
+
+        filepath = image_cache.CACHE_DIR / f"{digest}{image_cache.FORMAT}"
+        if filepath.is_file():
+            log("Baked World is found in cache", world, filepath)
+            return stage_cached(filepath, digest, dst)
+
+    rgb = bake(world, output_node, width)
+    digest = hashlib.blake2b(memoryview(rgb).cast('B'), digest_size=16).hexdigest() \
+        if rgb is not None else None
+    bakes[key] = digest
+    if len(bakes) > MAX_BAKES:
+        bakes.popitem(last=False)
+
+    if digest is None:
+        return None, None
+
+    filepath = image_cache.CACHE_DIR / f"{digest}{image_cache.FORMAT}"
+    if filepath.is_file():
+        return stage_cached(filepath, digest, dst)
+
+    log("World is baked", world, filepath)
+    image_cache.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = filepath.with_name(f"_{filepath.name}")
+    max_size = preferences().rs_image_cache_size * 1024 * 1024
+    return image_cache.stage_in_background(None, dst, None, digest, image_cache.encode_and_stage,
+                                           rgb, temp_path, filepath, dst, max_size)
+
+
+def stage_cached(filepath: Path, digest, dst: Path):
+    image_cache.touch(filepath)
+    if not staging.is_pending(dst) and staging.is_fresh(filepath, dst):
+        return dst, digest
+
+    return image_cache.stage_in_background(None, dst, None, digest, staging.stage_file, filepath, dst)
@@ -0,0 +1,145 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+"""
+Compiles World node tree to evaluation plan: flat list of steps, which evaluate node outputs
+in dependency order. Node outputs, which don't depend on images, are folded to constants,
+graph without images is folded to a single constant.
+Plans are cached by node tree fingerprint, evaluation of the known node tree doesn't walk links
+and doesn't look up node parsers.
+"""
+from collections import OrderedDict
+
+import bpy
+
+from .fingerprint import get_world_fingerprint
+from .node_parser import NodeParser, NodeItem, get_evaluation_order, get_input_links, get_key
+from .nodes import ShaderNodeOutputWorld
+from . import log
+
+
+MAX_PLANS = 8
+
+# node tree fingerprint -> Plan, least recently used plans go first
+plans = OrderedDict()
+
+
+class Plan:
+    def __init__(self, root_key, constants, steps, cache):
+        self.root_key = root_key
+        self.constants = constants
+        self.steps = steps
+        # results of node outputs, shared with node parsers of the steps
+        self.cache = cache
+
+    def evaluate(self, world: bpy.types.World):
+        if not self.steps:
+            return self.constants[self.root_key]
+
+        self.cache.clear()
+        self.cache.update(self.constants)
+        nodes = world.node_tree.nodes
+        for step in self.steps:
+            step(world, nodes)
+
+        return self.cache[self.root_key]
+
+
+def contains_id(value):
+    """Checks if export result references Blender data, which has to be read on each evaluation"""
+    if isinstance(value, NodeItem):
+        value = value.data
+
+    if isinstance(value, bpy.types.ID):
+        return True
+
+    if isinstance(value, dict):
+        return any(contains_id(val) for val in value.values())
+
+    if isinstance(value, (tuple, list)):
+        return any(contains_id(val) for val in value)
+
+    return False
+
+
+def make_step(node_parser: NodeParser, node_name, key):
+    """Returns closure, which evaluates node output with node parser bound to the current node"""
+    cache = node_parser.kwargs['cache']
+
+    def step(world, nodes):
+        # Blender data could be reallocated by undo, node parser is rebound by node name
+        node_parser.world = world
+        node_parser.node = nodes[node_name]
+        cache[key] = node_parser.export()
+
+    return step
+
+
+def compile_plan(world: bpy.types.World, output_node: bpy.types.Node):
+    """Compiles node tree of output_node, returns plan and result of evaluation"""
+    cache = {}
+    constant_keys = set()
+    steps = []
+
+    def add_step(node_parser, node, key):
+        result = cache[key] = node_parser.export()
+        dep_keys = {get_key(link.from_node, link.from_socket.identifier)
+                    for link in get_input_links(node)}
+        if dep_keys <= constant_keys and not contains_id(result):
+            constant_keys.add(key)
+        else:
+            steps.append(make_step(node_parser, node.name, key))
+
+    for link in get_input_links(output_node):
+        for node, out_key in get_evaluation_order(link.from_node, link.from_socket.identifier, world):
+            key = get_key(node, out_key)
+            if key in cache:
+                continue
+
+            NodeParser_cls = NodeParser.get_node_parser_cls(node.bl_idname)
+            if not NodeParser_cls:
+                log.warn("Ignoring unsupported node", node, world)
+                cache[key] = None
+                constant_keys.add(key)
+                continue
+
+            add_step(NodeParser_cls(world, node, out_key, cache=cache), node, key)
+
+    root_key = get_key(output_node, None)
+    add_step(ShaderNodeOutputWorld(world, output_node, cache=cache), output_node, root_key)
+
+    if root_key in constant_keys:
+        plan = Plan(root_key, {root_key: cache[root_key]}, [], {})
+    else:
+        plan = Plan(root_key, {key: cache[key] for key in constant_keys}, steps, cache)
+
+    log("World node tree is compiled", world, f"steps: {len(steps)}, constants: {len(constant_keys)}")
+    return plan, cache[root_key]
+
+
+def evaluate(world: bpy.types.World, output_node: bpy.types.Node):
+    """Returns export result of World output node, node tree is compiled only if it wasn't seen before"""
+    # images are read by the steps on each evaluation, only their names are part of the plan
+    key = get_world_fingerprint(world, image_content=False)
+    plan = plans.get(key)
+    if plan:
+        plans.move_to_end(key)
+        return plan.evaluate(world)
+
+    plan, result = compile_plan(world, output_node)
+    plans[key] = plan
+    if len(plans) > MAX_PLANS:
+        plans.popitem(last=False)
+
+    return result
@@ -0,0 +1,101 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+from pathlib import Path
+
+import bpy
+
+
+# properties of the base node class, they don't affect export
+BASE_NODE_PROPERTIES = {prop.identifier for prop in bpy.types.ShaderNode.bl_rna.properties}
+VALUE_PROPERTY_TYPES = {'BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM'}
+
+
+def get_value(value):
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+
+    if isinstance(value, set):    # enum flags
+        return tuple(sorted(value))
+
+    return tuple(value)
+
+
+def get_image_fingerprint(image: bpy.types.Image):
+    if not image:
+        return None
+
+    if image.is_dirty:
+        # pixels of edited image can't be checked cheaply, unique value makes fingerprint
+        # always differ, conversion of the same pixels is cached by image_cache
+        return object()
+
+    key = (image.name_full, image.filepath, image.source,
+           image.packed_file.size if image.packed_file else None,
+           image.colorspace_settings.name, tuple(image.size))
+    if image.source == 'GENERATED':
+        return (*key, image.generated_type, tuple(image.generated_color), image.generated_float)
+
+    # image file could be changed outside of Blender
+    image_path = Path(image.filepath_from_user())
+    if not image.packed_file and image_path.is_file():
+        stat = image_path.stat()
+        return (*key, stat.st_size, stat.st_mtime_ns)
+
+    return key
+
+
+def get_node_fingerprint(node: bpy.types.Node, image_content=True):
+    props = []
+    for prop in node.bl_rna.properties:
+        if prop.identifier in BASE_NODE_PROPERTIES:
+            continue
+
+        if prop.type in VALUE_PROPERTY_TYPES:
+            props.append((prop.identifier, get_value(getattr(node, prop.identifier))))
+
+        elif prop.type == 'POINTER':
+            value = getattr(node, prop.identifier)
+            if isinstance(value, bpy.types.Image):
+                props.append((prop.identifier,
+                              get_image_fingerprint(value) if image_content else value.name_full))
+            elif isinstance(value, bpy.types.ID):
+                props.append((prop.identifier, value.name_full))
+
+    sockets = tuple((socket.identifier, get_value(socket.default_value))
+                    for socket in (*node.inputs, *node.outputs)
+                    if hasattr(socket, 'default_value'))
+
+    return (node.name, node.bl_idname, node.mute, tuple(props), sockets)
+
+
+def get_world_fingerprint(world: bpy.types.World, image_content=True):
+    """
+    Returns hashable value, which is changed when anything, what affects World export,
+    is changed: nodes, links, socket default values and images.
+    If image_content is False, images are identified only by name.
+    """
+    if not world:
+        return None
+
+    if not world.use_nodes or not world.node_tree:
+        return world.name_full, tuple(world.color)
+
+    node_tree = world.node_tree
+    nodes = tuple(get_node_fingerprint(node, image_content) for node in node_tree.nodes)
+    links = tuple((link.from_node.name, link.from_socket.identifier,
+                   link.to_node.name, link.to_socket.identifier, link.is_valid, link.is_muted)
+                  for link in node_tree.links)
+
+    return world.name_full, nodes, links
@@ -0,0 +1,141 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+"""Radiance RGBE (.hdr) image writer and reader, which don't require bpy"""
+from pathlib import Path
+
+import numpy as np
+
+
+MIN_RUN = 4         # shorter runs are written as literals
+MAX_RUN = 127
+MAX_LITERAL = 128
+MIN_RLE_WIDTH = 8   # RLE scanlines are supported for widths in [8, 32768)
+MAX_RLE_WIDTH = 0x7fff
+
+
+def to_rgbe(rgb):
+    """Converts float array (..., 3) to uint8 RGBE array (..., 4)"""
+    rgb = np.maximum(rgb, 0.0, dtype=np.float32)
+    value = rgb.max(axis=-1)
+    mantissa, exponent = np.frexp(value)
+    # value = mantissa * 2^exponent, scale maps value to mantissa * 256
+    is_visible = value >= 1e-32
+    scale = np.divide(mantissa * 256.0, value, out=np.zeros_like(value), where=is_visible)
+
+    rgbe = np.empty((*rgb.shape[:-1], 4), dtype=np.uint8)
+    rgbe[..., :3] = np.minimum(rgb * scale[..., None], 255.0)
+    rgbe[..., 3] = np.where(is_visible, exponent + 128, 0)
+    return rgbe
+
+
+def from_rgbe(rgbe):
+    """Converts uint8 RGBE array (..., 4) to float32 array (..., 3)"""
+    exponent = rgbe[..., 3].astype(np.int32)
+    scale = np.where(exponent > 0, np.ldexp(1.0, exponent - (128 + 8)), 0.0).astype(np.float32)
+    return (rgbe[..., :3].astype(np.float32) + 0.5) * scale[..., None]
+
+
+def encode_channel(data, out: bytearray):
+    """Appends RLE encoded scanline channel to out"""
+    size = len(data)
+    starts = np.flatnonzero(np.diff(data)) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.append(starts, size))
+
+    is_run = lengths >= MIN_RUN
+    literal_start = 0
+    for start, length in zip(starts[is_run].tolist(), lengths[is_run].tolist()):
+        encode_literal(data, literal_start, start, out)
+        literal_start = start + length
+
+        value = int(data[start])
+        while length > 0:
+            count = min(length, MAX_RUN)
+            out += bytes((128 + count, value))
+            length -= count
+
+    encode_literal(data, literal_start, size, out)
+
+
+def encode_literal(data, start, end, out: bytearray):
+    while start < end:
+        count = min(end - start, MAX_LITERAL)
+        out.append(count)
+        out += data[start:start + count].tobytes()
+        start += count
+
+
+def encode(rgb):
+    """Encodes float array (height, width, 3), which rows go from top to bottom, to .hdr data"""
+    height, width = rgb.shape[:2]
+    out = bytearray(b"#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n")
+    out += f"-Y {height} +X {width}\n".encode()
+
+    rgbe = to_rgbe(rgb)
+    if not MIN_RLE_WIDTH <= width <= MAX_RLE_WIDTH:
+        out += rgbe.tobytes()
+        return bytes(out)
+
+    scanline_header = bytes((2, 2, width >> 8, width & 0xff))
+    # channels of each scanline are encoded separately
+    planes = np.ascontiguousarray(rgbe.transpose(0, 2, 1))
+    for scanline in planes:
+        out += scanline_header
+        for channel in scanline:
+            encode_channel(channel, out)
+
+    return bytes(out)
+
+
+def write_hdr(filepath: Path, rgb):
+    filepath.write_bytes(encode(rgb))
+
+
+def read_hdr(filepath: Path):
+    """Reads .hdr file, returns float32 array (height, width, 3) with rows from top to bottom"""
+    data = filepath.read_bytes()
+
+    pos = data.index(b"\n\n") + 2
+    end = data.index(b"\n", pos)
+    y_token, height, x_token, width = data[pos:end].split()
+    if y_token != b"-Y" or x_token != b"+X":
+        raise ValueError(f"Unsupported .hdr orientation: {data[pos:end]}")
+
+    height, width = int(height), int(width)
+    data = np.frombuffer(data, dtype=np.uint8, offset=end + 1)
+
+    rgbe = np.empty((height, width, 4), dtype=np.uint8)
+    pos = 0
+    for y in range(height):
+        if not (MIN_RLE_WIDTH <= width <= MAX_RLE_WIDTH and data[pos] == 2 and data[pos + 1] == 2):
+            # flat scanlines, old RLE isn't supported
+            rgbe[y:] = data[pos:pos + (height - y) * width * 4].reshape(height - y, width, 4)
+            break
+
+        pos += 4
+        for channel in range(4):
+            x = 0
+            while x < width:
+                count = int(data[pos])
+                if count > 128:
+                    count -= 128
+                    rgbe[y, x:x + count, channel] = data[pos + 1]
+                    pos += 2
+                else:
+                    rgbe[y, x:x + count, channel] = data[pos + 1:pos + 1 + count]
+                    pos += 1 + count
+                x += count
+
+    return from_rgbe(rgbe)
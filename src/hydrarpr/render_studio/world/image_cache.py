@@ -0,0 +1,229 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+from pathlib import Path
+import hashlib
+import tempfile
+import time
+
+import numpy as np
+
+import bpy
+
+from . import hdr
+from .. import staging
+from ...preferences import preferences
+
+from ... import logging
+log = logging.Log('export.world.image_cache')
+
+
+CACHE_DIR = Path(tempfile.gettempdir()) / "hydrarpr" / "image_cache"
+FORMAT = ".hdr"
+LINEAR_COLORSPACES = {'Linear', 'Linear Rec.709', 'Non-Color', 'Raw'}
+PROXY_WIDTH = 512
+
+# cache file name -> last access time in ns. Modification time of cache files isn't changed
+# on access: staged files are hard links to them, it would make staged files look changed
+access_times = {}
+
+
+def get_pixels(image: bpy.types.Image):
+    """Returns float32 array (height, width, channels) of image pixels or None for empty image"""
+    width, height = image.size
+    if not width or not height or not image.channels:
+        return None
+
+    pixels = np.empty(width * height * image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, image.channels)
+
+
+def get_digest(image: bpy.types.Image, pixels):
+    """Returns digest of image pixels and settings, which affect conversion"""
+    # save_render applies scene color management
+    view_settings = bpy.context.scene.view_settings
+    key = (*pixels.shape, image.colorspace_settings.name, image.alpha_mode, image.is_float,
+           view_settings.view_transform, view_settings.look, view_settings.exposure,
+           view_settings.gamma, bpy.context.scene.display_settings.display_device)
+
+    digest = hashlib.blake2b(memoryview(pixels.ravel()).cast('B'), digest_size=16)
+    digest.update(repr(key).encode())
+    return digest.hexdigest()
+
+
+def get_conversion(image: bpy.types.Image):
+    """Returns colorspace conversion of image pixels to linear RGB or None if it isn't supported"""
+    if image.channels < 3:
+        return None
+
+    if image.is_float:
+        return 'Linear'
+
+    colorspace = image.colorspace_settings.name
+    if colorspace in LINEAR_COLORSPACES:
+        return 'Linear'
+
+    if colorspace == 'sRGB':
+        return 'sRGB'
+
+    return None
+
+
+def to_linear_rgb(pixels, conversion):
+    """Returns linear RGB pixels with rows from top to bottom, doesn't access Blender data"""
+    rgb = pixels[::-1, :, :3]
+    if conversion == 'sRGB':
+        return np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4).astype(np.float32)
+
+    return rgb
+
+
+def get_linear_rgb(image: bpy.types.Image, pixels):
+    """
+    Returns linear RGB pixels with rows from top to bottom or None if colorspace
+    of the image isn't supported by hdr module.
+    """
+    conversion = get_conversion(image)
+    return to_linear_rgb(pixels, conversion) if conversion else None
+
+
+def stage_converted(image: bpy.types.Image, dst: Path, convert_func, proxy_dst: Path = None):
+    """
+    Stages image converted to .hdr to dst. Conversion is done only if image content
+    isn't found in the cache. Images in linear and sRGB colorspaces are encoded by hdr module
+    in the background, others are converted by convert_func(image, filepath).
+    Returns (path, digest) of the staged file or the proxy, or (None, None) if image can't be converted.
+    """
+    pixels = get_pixels(image)
+    if pixels is None:
+        log.warn("Image has no pixels", image)
+        return None, None
+
+    digest = get_digest(image, pixels)
+    filepath = CACHE_DIR / f"{digest}{FORMAT}"
+    if filepath.is_file():
+        log("Converted image is found in cache", image, filepath)
+        touch(filepath)
+        if not staging.is_pending(dst) and staging.is_fresh(filepath, dst):
+            return dst, digest
+
+        return stage_in_background(image, dst, proxy_dst, digest, staging.stage_file, filepath, dst,
+                                   pixels=pixels)
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = filepath.with_name(f"_{filepath.name}")
+    max_size = preferences().rs_image_cache_size * 1024 * 1024
+
+    rgb = get_linear_rgb(image, pixels)
+    if rgb is not None:
+        log("Encoding image in background", image, filepath)
+        return stage_in_background(image, dst, proxy_dst, digest,
+                                   encode_and_stage, rgb, temp_path, filepath, dst, max_size,
+                                   pixels=pixels)
+
+    if not convert_func(image, temp_path):
+        temp_path.unlink(missing_ok=True)
+        return None, None
+
+    add_to_cache(temp_path, filepath, max_size)
+    return stage_in_background(image, dst, None, digest, staging.stage_file, filepath, dst)
+
+
+def stage_in_background(image, dst: Path, proxy_dst: Path, digest, func, *args, pixels=None):
+    """
+    Runs func(*args), which stages dst, in the staging thread. If proxy_dst is set,
+    downsampled image is written to it, and layers don't wait for staging of dst.
+    Returns (path, digest) of the file, which should be referenced.
+    """
+    proxy_digest = stage_proxy(image, proxy_dst, digest, pixels) if proxy_dst else None
+    # staging goes through the background thread to keep order with other tasks for dst
+    staging.submit(dst, func, *args, deferred=bool(proxy_digest))
+    return (proxy_dst, proxy_digest) if proxy_digest else (dst, digest)
+
+
+def get_downsample_factor(shape, width):
+    """Returns integer factor, which downsamples image of shape (height, width, ...) to at least width wide"""
+    return max(1, min(shape[1] // width, shape[0]))
+
+
+def downsample(rgb, width):
+    """Area-averages (height, width, 3) array by integer factor, so that result is at least width wide"""
+    factor = get_downsample_factor(rgb.shape, width)
+    height, width = rgb.shape[0] // factor * factor, rgb.shape[1] // factor * factor
+    blocks = rgb[:height, :width].reshape(height // factor, factor, width // factor, factor, 3)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+def stage_proxy(image: bpy.types.Image, dst: Path, digest, pixels=None):
+    """
+    Writes downsampled image to dst in the staging thread. Returns digest of the proxy or None
+    if proxy isn't needed or can't be done.
+    """
+    if pixels is None:
+        pixels = get_pixels(image)
+        if pixels is None:
+            return None
+
+    conversion = get_conversion(image)
+    if not conversion or get_downsample_factor(pixels.shape, PROXY_WIDTH) == 1:
+        return None
+
+    # proxy is defined by the image content, so its digest is known before it is written
+    staging.submit(dst, write_proxy, pixels, conversion, dst)
+    return hashlib.blake2b(f"{digest}:proxy:{PROXY_WIDTH}".encode(), digest_size=16).hexdigest()
+
+
+def write_proxy(pixels, conversion, dst: Path):
+    data = hdr.encode(downsample(to_linear_rgb(pixels, conversion), PROXY_WIDTH))
+    staging.remove_file(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    dst.write_bytes(data)
+    log("Proxy is staged", dst)
+
+
+def encode_and_stage(rgb, temp_path: Path, filepath: Path, dst: Path, max_size):
+    hdr.write_hdr(temp_path, rgb)
+    add_to_cache(temp_path, filepath, max_size)
+    staging.stage_file(filepath, dst)
+
+
+def touch(filepath: Path):
+    """Marks cache file as recently used for eviction"""
+    access_times[filepath.name] = time.time_ns()
+
+
+def add_to_cache(temp_path: Path, filepath: Path, max_size):
+    temp_path.replace(filepath)
+    evict(max_size, keep=filepath)
+
+
+def evict(max_size, keep=None):
+    """Removes least recently used files until size of the cache fits max_size"""
+    files = []
+    for path in CACHE_DIR.iterdir():
+        if path.is_file() and path != keep and not path.name.startswith("_"):
+            stat = path.stat()
+            # files, which weren't accessed in this session, are ordered by creation
+            files.append((access_times.get(path.name, stat.st_mtime_ns), stat.st_size, path))
+
+    size = sum(file[1] for file in files) + (keep.stat().st_size if keep else 0)
+    for _, file_size, path in sorted(files):
+        if size <= max_size:
+            break
+
+        log("Evicting converted image", path)
+        path.unlink(missing_ok=True)
+        access_times.pop(path.name, None)
+        size -= file_size
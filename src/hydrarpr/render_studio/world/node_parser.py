@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ********************************************************************
-import math
+import numpy as np
 
 import bpy
 
@@ -20,19 +20,108 @@ from . import log
 
 
 def pass_node_reroute(link):
+    reroutes = set()
     while isinstance(link.from_node, bpy.types.NodeReroute):
-        if not link.from_node.inputs[0].links:
+        if not link.from_node.inputs[0].links or link.from_node.name in reroutes:
             return None
 
+        reroutes.add(link.from_node.name)
         link = link.from_node.inputs[0].links[0]
 
     return link if link.is_valid else None
 
+
+def get_input_links(node):
+    """Yields valid links, which are followed by parsers of node inputs"""
+    for socket_in in node.inputs:
+        if not socket_in.links or not socket_in.links[0].is_valid:
+            continue
+
+        link = pass_node_reroute(socket_in.links[0])
+        if link:
+            yield link
+
+
+def get_key(node, out_key):
+    # node names are unique in node tree and, unlike pointers, persist through undo
+    return node.name, out_key
+
+
+def get_evaluation_order(node, out_key, world=None):
+    """
+    Returns list of (node, output key), which node output depends on, including itself.
+    Dependencies go before the nodes, which use them. Traversal is iterative, cyclic links are ignored.
+    """
+    order = []
+    is_visiting = {}
+    stack = [(node, out_key, False)]
+    while stack:
+        node, out_key, is_exit = stack.pop()
+        key = get_key(node, out_key)
+        if is_exit:
+            order.append((node, out_key))
+            is_visiting[key] = False
+            continue
+
+        if key in is_visiting:
+            continue
+
+        is_visiting[key] = True
+        stack.append((node, out_key, True))
+        for link in get_input_links(node):
+            link_key = get_key(link.from_node, link.from_socket.identifier)
+            if is_visiting.get(link_key):
+                log.warn("Ignoring cyclic link", link.from_node, link.to_node, world)
+            elif link_key not in is_visiting:
+                stack.append((link.from_node, link.from_socket.identifier, False))
+
+    return order
+
+
 class NodeItem:
-    """This class is a wrapper used for doing operations on MaterialX nodes, floats, and tuples"""
+    """
+    This class is a wrapper used for doing operations on floats, colors and other export data.
+    Floats and colors are held in float arrays: 0-d array for float and 1-d array of channels
+    for color. Batched items hold grids of values, e.g. image pixels, in arrays (..., channels)
+    or (...) for floats, and go through the same operations with NumPy broadcasting.
+    """
+
+    __slots__ = ('value', 'channels', 'is_batched')
+
+    def __init__(self, data: [tuple, float, dict, np.ndarray], channels=None):
+        """channels is used for arrays: 0 for grid of floats, number of color channels otherwise"""
+        if isinstance(data, np.ndarray):
+            self.value = data
+            self.channels = channels or 0
+            self.is_batched = data.ndim > (1 if self.channels else 0)
+        elif isinstance(data, float):
+            self.value = np.array(data)
+            self.channels = 0
+            self.is_batched = False
+        elif isinstance(data, tuple):
+            self.value = np.array(data, dtype=np.float64)
+            self.channels = len(data)
+            self.is_batched = False
+        else:
+            # data, which isn't used in arithmetic: dict, image, string, None
+            self.value = data
+            self.channels = None
+            self.is_batched = False
+
+    @property
+    def data(self):
+        """Returns float, tuple, array of batched item or other data"""
+        if self.channels is None or self.is_batched:
+            return self.value
+
+        if not self.channels:
+            return float(self.value)
 
-    def __init__(self, data: [tuple, float, dict]):
-        self.data = data
+        return tuple(self.value.tolist())
+
+    @data.setter
+    def data(self, data):
+        self.__init__(data)
 
     def node_item(self, value):
         if isinstance(value, NodeItem):
@@ -41,69 +130,96 @@ class NodeItem:
         return NodeItem(value)
 
     # MATH OPERATIONS
+    def _align(self, other):
+        """
+        Returns values of numeric items and number of channels of result or None for other data.
+        Float is broadcasted to color, shorter color is padded by 1.0, then both colors are cut
+        to the shorter length.
+        """
+        if self.channels is None or other.channels is None:
+            return None
+
+        value, other_value = self.value, other.value
+        if self.channels == other.channels and self.is_batched == other.is_batched:
+            return value, other_value, self.channels
+
+        channels = self.channels or other.channels
+        if self.channels and other.channels:
+            if self.channels < other.channels:
+                value = pad_channel(value)
+            elif other.channels < self.channels:
+                other_value = pad_channel(other_value)
+
+            channels = min(value.shape[-1], other_value.shape[-1])
+            value, other_value = value[..., :channels], other_value[..., :channels]
+
+        elif self.channels:
+            other_value = other_value[..., None]
+
+        elif other.channels:
+            value = value[..., None]
+
+        # precision of batched data is kept
+        if self.is_batched != other.is_batched:
+            if self.is_batched:
+                other_value = other_value.astype(value.dtype)
+            else:
+                value = value.astype(other_value.dtype)
+
+        return value, other_value, channels
+
     def _arithmetic_helper(self, other, func):
         if other is None:
-            if isinstance(self.data, float):
-                result_data = func(self.data)
-            elif isinstance(self.data, tuple):
-                result_data = tuple(map(func, self.data))
-            else:
-                result_data = self.data
+            if self.channels is None:
+                return self
 
-        else:
-            other_data = other.data if isinstance(other, NodeItem) else other
-            if isinstance(self.data, (float, tuple)) and isinstance(other_data, (float, tuple)):
-                if isinstance(self.data, float) and isinstance(other_data, float):
-                    result_data = func(self.data, other_data)
-                else:
-                    data = self.data
-
-                    # converting data or other_data to have equal length
-                    if isinstance(data, float):
-                        data = (data,) * len(other_data)
-                    elif isinstance(other_data, float):
-                        other_data = (other_data,) * len(data)
-                    elif len(data) < len(other_data):
-                        data = (*data, 1.0)
-                    elif len(other_data) < len(data):
-                        other_data = (*other_data, 1.0)
-
-                    result_data = tuple(map(func, data, other_data))
+            return NodeItem(np.asarray(func(self.value)), self.channels)
 
-            else:
-                result_data = other_data if isinstance(self.data, (float, tuple)) else self.data
+        if isinstance(other, float) and self.channels is not None:
+            # python float is broadcasted to any shape and keeps precision of the array
+            return NodeItem(np.asarray(func(self.value, other)), self.channels)
 
-        return self.node_item(result_data)
+        other = self.node_item(other)
+        aligned = self._align(other)
+        if aligned is None:
+            return other if self.channels is not None else self
+
+        value, other_value, channels = aligned
+        return NodeItem(np.asarray(func(value, other_value)), channels)
 
     def __add__(self, other):
-        return self._arithmetic_helper(other, lambda a, b: a + b)
+        return self._arithmetic_helper(other, np.add)
 
     def __sub__(self, other):
-        return self._arithmetic_helper(other, lambda a, b: a - b)
+        return self._arithmetic_helper(other, np.subtract)
 
     def __mul__(self, other):
-        return self._arithmetic_helper(other, lambda a, b: a * b)
+        return self._arithmetic_helper(other, np.multiply)
 
     def __truediv__(self, other):
-        return self._arithmetic_helper(other, lambda a, b: a / b if not math.isclose(b, 0.0) else 0.0)
+        return self._arithmetic_helper(other, safe_divide)
 
     def __mod__(self, other):
-        return self._arithmetic_helper(other, lambda a, b: a % b)
+        return self._arithmetic_helper(other, safe_mod)
+
+    def fmod(self, other):
+        """Truncated modulo, result has sign of self like C fmod"""
+        return self._arithmetic_helper(other, safe_fmod)
 
     def __pow__(self, other):
-        return self._arithmetic_helper(other, lambda a, b: a ** b)
+        return self._arithmetic_helper(other, safe_power)
 
     def __neg__(self):
         return 0.0 - self
 
     def __abs__(self):
-        return self._arithmetic_helper(None, lambda a: abs(a))
+        return self._arithmetic_helper(None, np.abs)
 
     def floor(self):
-        return self._arithmetic_helper(None, lambda a: float(math.floor(a)))
+        return self._arithmetic_helper(None, np.floor)
 
     def ceil(self):
-        return self._arithmetic_helper(None, lambda a: float(math.ceil(a)))
+        return self._arithmetic_helper(None, np.ceil)
 
     # right hand methods for doing something like 1.0 - Node
     def __radd__(self, other):
@@ -125,76 +241,151 @@ class NodeItem:
         return self.node_item(other) ** self
 
     def dot(self, other):
-        dot = self._arithmetic_helper(other, lambda a, b: a * b)
-        if isinstance(dot.data, tuple):
-            dot.data = sum(dot.data)
+        dot = self * other
+        if dot.channels:
+            return NodeItem(np.asarray(dot.value.sum(axis=-1)), 0)
 
         return dot
 
     def if_else(self, cond: str, other, if_value, else_value):
         if cond == '>':
-            res = self._arithmetic_helper(other, lambda a, b: float(a > b))
+            res = self._arithmetic_helper(other, lambda a, b: compare(np.greater, a, b))
         elif cond == '>=':
-            res = self._arithmetic_helper(other, lambda a, b: float(a >= b))
+            res = self._arithmetic_helper(other, lambda a, b: compare(np.greater_equal, a, b))
         elif cond == '==':
-            res = self._arithmetic_helper(other, lambda a, b: float(a == b))
+            res = self._arithmetic_helper(other, lambda a, b: compare(np.equal, a, b))
         elif cond == '<':
-            return self.node_item(other).if_else('>', self, else_value, if_value)
+            # self < other is other > self
+            return self.node_item(other).if_else('>', self, if_value, else_value)
         elif cond == '<=':
-            return self.node_item(other).if_else('>=', self, else_value, if_value)
+            return self.node_item(other).if_else('>=', self, if_value, else_value)
         elif cond == '!=':
             return self.if_else('==', other, else_value, if_value)
         else:
             raise ValueError("Incorrect condition:", cond)
 
-        if isinstance(res.data, float):
-            return if_value if res.data == 1.0 else else_value
-        elif isinstance(res.data, tuple):
-            return if_value if res.data[0] == 1.0 else else_value
-        else:
+        if res.channels is None:
             return res
 
+        if res.is_batched:
+            return res._select(if_value, else_value)
+
+        # first channel of color is the condition
+        value = res.value[0] if res.channels else res.value
+        return if_value if value == 1.0 else else_value
+
+    def _select(self, if_value, else_value):
+        """Selects if_value or else_value per element of batched condition"""
+        if_item, else_item = self.node_item(if_value), self.node_item(else_value)
+        aligned = if_item._align(else_item)
+        if aligned is None:
+            return else_item if if_item.channels is not None else if_item
+
+        value, other_value, channels = aligned
+        mask = (self.value[..., 0] if self.channels else self.value) == 1.0
+        if channels:
+            mask = mask[..., None]
+
+        return NodeItem(np.where(mask, value, other_value), channels)
+
     def min(self, other):
-        return self._arithmetic_helper(other, lambda a, b: min(a, b))
+        return self._arithmetic_helper(other, np.minimum)
 
     def max(self, other):
-        return self._arithmetic_helper(other, lambda a, b: max(a, b))
+        return self._arithmetic_helper(other, np.maximum)
 
     def clamp(self, min_val=0.0, max_val=1.0):
         """ clamp data to min/max """
         return self.min(max_val).max(min_val)
 
     def sin(self):
-        return self._arithmetic_helper(None, lambda a: math.sin(a))
+        return self._arithmetic_helper(None, np.sin)
 
     def cos(self):
-        return self._arithmetic_helper(None, lambda a: math.cos(a))
+        return self._arithmetic_helper(None, np.cos)
 
     def tan(self):
-        return self._arithmetic_helper(None, lambda a: math.tan(a))
+        return self._arithmetic_helper(None, np.tan)
 
     def asin(self):
-        return self._arithmetic_helper(None, lambda a: math.asin(a))
+        return self._arithmetic_helper(None, safe_arcsin)
 
     def acos(self):
-        return self._arithmetic_helper(None, lambda a: math.acos(a))
+        return self._arithmetic_helper(None, safe_arccos)
 
     def atan(self):
-        return self._arithmetic_helper(None, lambda a: math.atan(a))
+        return self._arithmetic_helper(None, np.arctan)
 
     def log(self):
-        return self._arithmetic_helper(None, lambda a: math.log(a))
+        return self._arithmetic_helper(None, safe_log)
 
     def blend(self, value1, value2):
         """ Line interpolate value between value1(0.0) and value2(1.0) by self.data as factor """
         return self * value2 + (1.0 - self) * value1
 
 
+def apply(func, *args):
+    """
+    Applies NumPy function, which could give invalid results for invalid node graphs.
+    NaN and infinity are replaced by 0.0, so they don't get to World color.
+    """
+    with np.errstate(all='ignore'):
+        res = np.asarray(func(*args))
+
+    if res.dtype.kind == 'f' and not np.isfinite(res).all():
+        res = np.asarray(np.nan_to_num(res, nan=0.0, posinf=0.0, neginf=0.0))
+
+    return res
+
+
+def safe_mod(a, b):
+    return apply(np.mod, a, b)
+
+
+def safe_fmod(a, b):
+    return apply(np.fmod, a, b)
+
+
+def safe_power(a, b):
+    return apply(np.power, a, b)
+
+
+def safe_log(a):
+    return apply(np.log, a)
+
+
+def safe_arcsin(a):
+    # argument is clamped like in Blender safe_asinf
+    return np.arcsin(np.clip(a, -1.0, 1.0))
+
+
+def safe_arccos(a):
+    return np.arccos(np.clip(a, -1.0, 1.0))
+
+
+def pad_channel(value):
+    """Appends channel filled by 1.0 to array (..., channels)"""
+    return np.concatenate((value, np.ones((*value.shape[:-1], 1), dtype=value.dtype)), axis=-1)
+
+
+def safe_divide(a, b):
+    """Divides a by b, division by zero gives 0.0"""
+    out = np.zeros(np.broadcast_shapes(np.shape(a), np.shape(b)), dtype=np.result_type(a, b))
+    return np.divide(a, b, out=out, where=b != 0.0)
+
+
+def compare(func, a, b):
+    """Returns 1.0 where func(a, b) is True and 0.0 elsewhere"""
+    return func(a, b).astype(np.result_type(a, b))
+
+
 class NodeParser:
     """
     This is the base class that parses a blender node.
     Subclasses should override only export() function.
     """
+    # image data of linked nodes is kept as is, otherwise it is sampled per pixel during baking
+    accepts_images = False
 
     def __init__(self, world: bpy.types.World,
                  node: bpy.types.Node, out_key, **kwargs):
@@ -211,6 +402,28 @@ class NodeParser:
 
     # INTERNAL FUNCTIONS
     def _export_node(self, node, out_key, group_node=None):
+        cache = self.kwargs.get('cache')
+        if cache is None:
+            return self._evaluate(node, out_key)
+
+        # all nodes, which could be requested, are evaluated beforehand by _evaluate(),
+        # missing node is the one, which is being evaluated: there is a cycle
+        return cache.get(get_key(node, out_key))
+
+    def _evaluate(self, node, out_key):
+        """
+        Evaluates graph of node output: dependencies are exported before the nodes, which use them,
+        and are put to the cache shared by all parsers of the export pass.
+        Each node output is exported once.
+        """
+        cache = self.kwargs['cache'] = {}
+        for dep_node, dep_out_key in get_evaluation_order(node, out_key, self.world):
+            cache[get_key(dep_node, dep_out_key)] = self._export_output(dep_node, dep_out_key)
+
+        return cache[get_key(node, out_key)]
+
+    def _export_output(self, node, out_key):
+        """Returns export result of node output"""
         # getting corresponded NodeParser class
         NodeParser_cls = self.get_node_parser_cls(node.bl_idname)
         if not NodeParser_cls:
@@ -250,7 +463,6 @@ class NodeParser:
 
     def get_input_default(self, in_key):
         """ Returns default value of input socket """
-
         socket_in = self.node.inputs[in_key]
         return self.node_item(self._parse_val(socket_in.default_value))
 
@@ -272,7 +484,13 @@ class NodeParser:
         if not link:
             return None
 
-        return self._export_node(link.from_node, link.from_socket.identifier)
+        val = self._export_node(link.from_node, link.from_socket.identifier)
+        bake = self.kwargs.get('bake')
+        if bake and val is not None and not self.accepts_images and \
+                isinstance(val.data, dict) and val.data.get('image'):
+            return bake.sample_image(val.data['image'], val.data.get('vector'))
+
+        return val
 
     def get_input_value(self, in_key):
         """ Returns linked node or default socket value """
@@ -286,7 +504,7 @@ class NodeParser:
     def get_input_scalar(self, socket_key):
         """ Parse link, accept only RPR core material nodes """
         val = self.get_input_link(socket_key)
-        if val is not None and isinstance(val.data, (float, tuple)):
+        if val is not None and val.channels is not None:
             return val
 
         return self.get_input_default(socket_key)
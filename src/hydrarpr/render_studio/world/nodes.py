@@ -12,10 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ********************************************************************
-from .node_parser import NodeParser
+import math
+
+import numpy as np
+
+from .node_parser import NodeParser, NodeItem
+from .bake import get_sky
+from . import log
 
 
 class ShaderNodeOutputWorld(NodeParser):
+    accepts_images = True
+
     def __init__(self, world, node, **kwargs):
         super().__init__(world, node, None, **kwargs)
 
@@ -24,6 +32,8 @@ class ShaderNodeOutputWorld(NodeParser):
 
 
 class ShaderNodeBackground(NodeParser):
+    accepts_images = True
+
     def export(self):
         color = self.get_input_value('Color').data
         strength = self.get_input_scalar('Strength').data
@@ -36,16 +46,16 @@ class ShaderNodeBackground(NodeParser):
 
 class ShaderNodeTexEnvironment(NodeParser):
     def export(self):
-        return self.node_item({
-            'image': self.node.image
-        })
+        data = {'image': self.node.image}
+        if self.kwargs.get('bake'):
+            # direction of image lookup during baking
+            data['vector'] = self.get_input_link('Vector')
 
+        return self.node_item(data)
 
-class ShaderNodeTexImage(NodeParser):
-    def export(self):
-        return self.node_item({
-            'image': self.node.image
-        })
+
+class ShaderNodeTexImage(ShaderNodeTexEnvironment):
+    pass
 
 
 class ShaderNodeRGB(NodeParser):
@@ -64,3 +74,208 @@ class ShaderNodeInvert(NodeParser):
         color = self.get_input_scalar('Color')
 
         return fac.blend(color, 1.0 - color)
+
+
+class BakedNodeParser(NodeParser):
+    """Base class of nodes, which depend on view direction and can be exported only by baking"""
+
+    def export(self):
+        bake = self.kwargs.get('bake')
+        if not bake:
+            log.warn("Node requires World baking", self.node, self.world)
+            return None
+
+        return self.export_baked(bake)
+
+    def export_baked(self, bake):
+        return None
+
+    def get_vector(self, bake):
+        """Returns linked vector or view direction"""
+        vector = self.get_input_link('Vector') if 'Vector' in self.node.inputs else None
+        return vector if vector is not None and vector.channels else bake.directions
+
+
+class ShaderNodeTexCoord(BakedNodeParser):
+    def export_baked(self, bake):
+        # all coordinates of World shader are the view direction
+        return bake.directions
+
+
+class ShaderNodeTexGradient(BakedNodeParser):
+    def export_baked(self, bake):
+        x, y, z = np.moveaxis(self.get_vector(bake).value, -1, 0)
+        gradient_type = self.node.gradient_type
+        if gradient_type == 'QUADRATIC':
+            fac = np.maximum(x, 0.0) ** 2
+        elif gradient_type == 'EASING':
+            fac = np.clip(x, 0.0, 1.0)
+            fac = fac * fac * (3.0 - 2.0 * fac)
+        elif gradient_type == 'DIAGONAL':
+            fac = (x + y) * 0.5
+        elif gradient_type == 'RADIAL':
+            fac = np.arctan2(y, x) / (2.0 * math.pi) + 0.5
+        elif gradient_type == 'QUADRATIC_SPHERE':
+            fac = np.maximum(1.0 - np.sqrt(x * x + y * y + z * z), 0.0) ** 2
+        elif gradient_type == 'SPHERICAL':
+            fac = np.maximum(1.0 - np.sqrt(x * x + y * y + z * z), 0.0)
+        else:   # LINEAR
+            fac = x
+
+        fac = self.node_item(np.clip(fac, 0.0, 1.0))
+        if self.out_key == 'Fac':
+            return fac
+
+        return fac * (1.0, 1.0, 1.0, 1.0)
+
+
+class ShaderNodeTexSky(BakedNodeParser):
+    def export_baked(self, bake):
+        return NodeItem(get_sky(self.node, self.get_vector(bake).value), 3)
+
+
+class ShaderNodeMath(NodeParser):
+    """
+    Operations follow Blender safe math: invalid results, e.g. modulo by zero, logarithm of
+    non-positive value, square root of negative value, are 0.0
+    """
+
+    def export(self):
+        op = self.node.operation
+        a = self.get_input_scalar(0)
+        b = self.get_input_scalar(1)
+
+        if op == 'ADD':
+            res = a + b
+        elif op == 'SUBTRACT':
+            res = a - b
+        elif op == 'MULTIPLY':
+            res = a * b
+        elif op == 'DIVIDE':
+            res = a / b
+        elif op == 'MULTIPLY_ADD':
+            res = a * b + self.get_input_scalar(2)
+        elif op == 'POWER':
+            res = a ** b
+        elif op == 'LOGARITHM':
+            res = a.log() / b.log()
+        elif op == 'SQRT':
+            res = a ** 0.5
+        elif op == 'INVERSE_SQRT':
+            res = 1.0 / a ** 0.5
+        elif op == 'ABSOLUTE':
+            res = abs(a)
+        elif op == 'EXPONENT':
+            res = math.e ** a
+        elif op == 'MINIMUM':
+            res = a.min(b)
+        elif op == 'MAXIMUM':
+            res = a.max(b)
+        elif op == 'LESS_THAN':
+            res = self.node_item(a.if_else('<', b, 1.0, 0.0))
+        elif op == 'GREATER_THAN':
+            res = self.node_item(a.if_else('>', b, 1.0, 0.0))
+        elif op == 'ROUND':
+            res = (a + 0.5).floor()
+        elif op == 'FLOOR':
+            res = a.floor()
+        elif op == 'CEIL':
+            res = a.ceil()
+        elif op == 'FRACT':
+            res = a - a.floor()
+        elif op == 'MODULO':
+            res = a.fmod(b)
+        elif op == 'FLOORED_MODULO':
+            res = a % b
+        elif op == 'TRUNC':
+            res = a.if_else('>=', 0.0, a.floor(), a.ceil())
+        elif op == 'SIGN':
+            res = self.node_item(a.if_else('>', 0.0, 1.0, 0.0)) - a.if_else('<', 0.0, 1.0, 0.0)
+        elif op == 'RADIANS':
+            res = a * (math.pi / 180.0)
+        elif op == 'DEGREES':
+            res = a * (180.0 / math.pi)
+        elif op == 'SINE':
+            res = a.sin()
+        elif op == 'COSINE':
+            res = a.cos()
+        elif op == 'TANGENT':
+            res = a.tan()
+        elif op == 'ARCSINE':
+            res = a.asin()
+        elif op == 'ARCCOSINE':
+            res = a.acos()
+        elif op == 'ARCTANGENT':
+            res = a.atan()
+        else:
+            log.warn("Ignoring unsupported node", self.node, f"operation: {op}", self.world)
+            return None
+
+        if self.node.use_clamp:
+            res = res.clamp()
+
+        return res
+
+
+def mix(blend_type, fac, color1, color2):
+    """Blends color2 over color1 with factor fac like Blender Mix node does"""
+    if blend_type == 'ADD':
+        return color1 + fac * color2
+    if blend_type == 'SUBTRACT':
+        return color1 - fac * color2
+    if blend_type == 'MULTIPLY':
+        return color1 * (1.0 - fac + fac * color2)
+    if blend_type == 'SCREEN':
+        return 1.0 - (1.0 - fac + fac * (1.0 - color2)) * (1.0 - color1)
+    if blend_type == 'DIVIDE':
+        return fac.blend(color1, color1 / color2)
+    if blend_type == 'DIFFERENCE':
+        return fac.blend(color1, abs(color1 - color2))
+    if blend_type == 'DARKEN':
+        return fac.blend(color1, color1.min(color2))
+    if blend_type == 'LIGHTEN':
+        return fac.blend(color1, color1.max(color2))
+
+    if blend_type != 'MIX':
+        log.warn("Unsupported blend type is exported as Mix", blend_type)
+
+    return fac.blend(color1, color2)
+
+
+class ShaderNodeMixRGB(NodeParser):
+    def export(self):
+        fac = self.get_input_scalar('Fac').clamp()
+        res = mix(self.node.blend_type, fac,
+                  self.get_input_scalar('Color1'), self.get_input_scalar('Color2'))
+
+        if self.node.use_clamp:
+            res = res.clamp()
+
+        return res
+
+
+class ShaderNodeMix(NodeParser):
+    def get_index(self, identifier):
+        """Returns index of input socket: sockets of different data types have the same names"""
+        return next(i for i, socket in enumerate(self.node.inputs) if socket.identifier == identifier)
+
+    def export(self):
+        data_type = self.node.data_type
+        suffix = {'FLOAT': 'Float', 'VECTOR': 'Vector', 'RGBA': 'Color'}.get(data_type, 'Color')
+        fac_suffix = 'Vector' if data_type == 'VECTOR' and self.node.factor_mode == 'NON_UNIFORM' \
+            else 'Float'
+
+        fac = self.get_input_scalar(self.get_index(f"Factor_{fac_suffix}"))
+        if self.node.clamp_factor:
+            fac = fac.clamp()
+
+        a = self.get_input_scalar(self.get_index(f"A_{suffix}"))
+        b = self.get_input_scalar(self.get_index(f"B_{suffix}"))
+        if data_type != 'RGBA':
+            return fac.blend(a, b)
+
+        res = mix(self.node.blend_type, fac, a, b)
+        if self.node.clamp_result:
+            res = res.clamp()
+
+        return res
@@ -0,0 +1,297 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+from pathlib import Path
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from pxr import Sdf
+
+from .telemetry import telemetry
+from . import staging
+
+from .. import logging
+log = logging.Log("rs.writer")
+
+
+MAX_PENDING = 16
+STOP_TIMEOUT = 10.0     # seconds
+
+# temporary directories, which couldn't be removed, e.g. files are still open on Windows
+stale_temp_dirs = set()
+
+
+class WriteJob:
+    """
+    Writes layer to path. Additional layers, which are written before it, could be provided
+    in parts as list of (layer, path, extra), layer could be a path of the file with serialized layer
+    in the format of path. on_written is called in the writer thread
+    after all files are written.
+    """
+
+    def __init__(self, layer, path: Path, temp_dir: Path = None, overwrite_textures=False, extra=b"",
+                 parts=(), verify_textures=False, on_written=None):
+        self.path = path
+        self.on_written = on_written
+        self.files = [*parts, (layer, path, extra)]
+        self.temp_dir = temp_dir
+        self.overwrite_textures = overwrite_textures
+        self.verify_textures = verify_textures
+        self.sync_id = telemetry.sync_id
+        self.size = 0
+        self.is_cancelled = False
+
+    def cancel(self):
+        """Makes running job stop before writing of the next file"""
+        self.is_cancelled = True
+
+    def run(self, digests):
+        """Writes layers, which content is changed. Returns numbers of written and skipped files"""
+        # layers could reference textures, which are still staged in the background
+        staging.wait()
+
+        if self.temp_dir:
+            copy_textures(self.temp_dir / "textures", self.path.parent / "textures",
+                          self.overwrite_textures, self, self.verify_textures)
+
+        written = skipped = 0
+        for layer, path, extra in self.files:
+            if self.is_cancelled:
+                break
+
+            size = write_file(layer, path, extra, digests)
+            if size:
+                written += 1
+                self.size += size
+            else:
+                skipped += 1
+
+        if self.on_written and not self.is_cancelled:
+            self.on_written()
+
+        return written, skipped
+
+    def discard(self):
+        self.files = []
+        if self.temp_dir:
+            remove_temp_dir(self.temp_dir)
+
+        # retry directories, which couldn't be removed before
+        for temp_dir in list(stale_temp_dirs):
+            remove_temp_dir(temp_dir)
+
+
+def remove_temp_dir(temp_dir: Path):
+    try:
+        shutil.rmtree(temp_dir)
+
+    except FileNotFoundError:
+        pass
+
+    except OSError as err:
+        if temp_dir not in stale_temp_dirs:
+            log.warn("Can't remove temporary directory, it will be retried", temp_dir, err)
+            stale_temp_dirs.add(temp_dir)
+        return
+
+    stale_temp_dirs.discard(temp_dir)
+
+
+def write_file(layer, path: Path, extra, digests):
+    """Writes layer to file if its content is changed, returns number of written bytes"""
+    # already serialized layer is only read, python releases GIL during I/O
+    data = layer.read_bytes() if isinstance(layer, Path) else serialize(layer, path.suffix)
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(extra)
+    digest = digest.digest()
+    if digests.get(path) == digest and path.is_file():
+        return 0
+
+    # pxr holds GIL during serialization, file is written by python to release it during I/O
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    digests[path] = digest
+    return len(data)
+
+
+def serialize(layer, suffix):
+    # pxr holds GIL during serialization, it blocks the main thread for its duration
+    if suffix == '.usda':
+        return layer.ExportToString().encode('utf-8')
+
+    fd, temp_path = tempfile.mkstemp(suffix=suffix, prefix="hydrarpr_")
+    os.close(fd)
+    try:
+        layer.Export(temp_path)
+        return Path(temp_path).read_bytes()
+
+    finally:
+        os.remove(temp_path)
+
+
+def copy_textures(src_dir: Path, dst_dir: Path, overwrite, job=None, verify=False):
+    """Stages textures exported by Blender USD exporter to the channel directory"""
+    if not src_dir.is_dir():
+        return
+
+    for src in src_dir.rglob("*"):
+        if job and job.is_cancelled:
+            return
+
+        if not src.is_file():
+            continue
+
+        dst = dst_dir / src.relative_to(src_dir)
+        if dst.is_file() and not overwrite:
+            continue
+
+        staging.stage_file(src, dst, verify)
+
+
+class LayerWriter:
+    """
+    Writes layers to files in the background thread. The queue is bounded, pending write
+    of a file is superseded by the newer write of the same file, the running write
+    of the file is cancelled.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.in_flight = None
+        self._in_flight_job = None
+        self.written = 0
+        self.superseded = 0
+        self.skipped = 0
+
+        self._jobs = {}
+        self._digests = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._is_stopped = False
+
+    @property
+    def pending(self):
+        return len(self._jobs)
+
+    @property
+    def is_busy(self):
+        return bool(self._jobs) or self.in_flight is not None
+
+    def reset_stats(self):
+        self.written = 0
+        self.superseded = 0
+        self.skipped = 0
+
+    def clear_digests(self):
+        self._digests = {}
+
+    def write(self, layer, path: Path, temp_dir: Path = None, overwrite_textures=False, extra=b"",
+              parts=(), verify_textures=False, on_written=None):
+        """
+        Queues layer for writing to path. Layer should not be changed after this call;
+        use write_snapshot() for layers, which are edited later.
+        Writing of a file is skipped if layer content and extra data are the same as were written before.
+        """
+        job = WriteJob(layer, path, temp_dir, overwrite_textures, extra, parts, verify_textures, on_written)
+
+        with self._cond:
+            while path not in self._jobs and len(self._jobs) >= self.max_pending:
+                self._cond.wait()
+
+            old_job = self._jobs.pop(path, None)
+            if old_job:
+                log("Write is superseded", path)
+                old_job.discard()
+                self.superseded += 1
+
+            # newer job contains all files and textures of the running one
+            if self.in_flight == path and not self._in_flight_job.is_cancelled:
+                log("Running write is cancelled", path)
+                self._in_flight_job.cancel()
+                self.superseded += 1
+
+            self._jobs[path] = job
+            self._cond.notify_all()
+
+            if not self._thread:
+                self._is_stopped = False
+                self._thread = threading.Thread(target=self._run, name="RenderStudioWriter", daemon=True)
+                self._thread.start()
+
+    def write_snapshot(self, layer, path: Path, extra=b""):
+        snapshot = Sdf.Layer.CreateAnonymous(path.suffix)
+        snapshot.TransferContent(layer)
+        self.write(snapshot, path, extra=extra)
+
+    def flush(self):
+        """Waits until all queued layers are written"""
+        with self._cond:
+            while self.is_busy:
+                self._cond.wait()
+
+    def stop(self):
+        """Writes queued layers and stops the writer thread"""
+        with self._cond:
+            self._is_stopped = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+
+        if thread:
+            thread.join(STOP_TIMEOUT)
+            if thread.is_alive():
+                log.warn("Writer thread isn't stopped", f"pending: {self.pending}")
+
+        for temp_dir in list(stale_temp_dirs):
+            remove_temp_dir(temp_dir)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs and not self._is_stopped:
+                    self._cond.wait()
+
+                if not self._jobs:
+                    return
+
+                path = next(iter(self._jobs))
+                job = self._jobs.pop(path)
+                self.in_flight = path
+                self._in_flight_job = job
+                self._cond.notify_all()
+
+            written = skipped = 0
+            start = time.perf_counter()
+            try:
+                written, skipped = job.run(self._digests)
+
+            except Exception as err:
+                log.error("Can't write layer", path, err)
+
+            finally:
+                job.discard()
+                telemetry.add_written(job.sync_id, time.perf_counter() - start, job.size)
+
+            with self._cond:
+                self.in_flight = None
+                self._in_flight_job = None
+                self.written += written
+                self.skipped += skipped
+                self._cond.notify_all()
+
+            log("Layers are written", path, f"written: {written}, unchanged: {skipped}",
+                f"total written: {self.written}, total unchanged: {self.skipped}")
@@ -71,6 +71,13 @@ class RPR_HYDRA_RENDER_PT_samples_final(FinalPanel):
         row.enabled = settings.variance_threshold > 0.0
         row.prop(settings, "min_adaptive_samples")
 
+        col = layout.column(align=True)
+        col.prop(settings, "use_time_budget")
+        col = col.column(align=True)
+        col.enabled = settings.use_time_budget
+        col.prop(settings, "time_budget")
+        col.prop(settings, "time_budget_ray_depth")
+
 
 class RPR_HYDRA_RENDER_PT_quality_final(FinalPanel):
     bl_label = "Quality"
@@ -149,7 +156,13 @@ class RPR_HYDRA_RENDER_PT_viewport(Panel):
         layout.use_property_decorate = False
 
         settings = context.scene.hydra_rpr.viewport
-        layout.prop(settings, "render_quality")
+        layout.prop(settings, "auto_quality")
+        row = layout.row()
+        row.enabled = settings.auto_quality
+        row.prop(settings, "idle_time")
+        row = layout.row()
+        row.enabled = not settings.auto_quality
+        row.prop(settings, "render_quality")
         layout.prop(settings, "render_mode")
 
 
@@ -180,6 +193,13 @@ class RPR_HYDRA_RENDER_PT_samples_viewport(ViewportPanel):
         row.enabled = settings.variance_threshold > 0.0
         row.prop(settings, "min_adaptive_samples")
 
+        col = layout.column(align=True)
+        col.prop(settings, "idle_suspend")
+        col = col.column(align=True)
+        col.enabled = settings.idle_suspend
+        col.prop(settings, "suspend_time")
+        col.prop(settings, "idle_release")
+
 
 class RPR_HYDRA_RENDER_PT_quality_viewport(ViewportPanel):
     bl_label = "Quality"
@@ -191,9 +211,18 @@ class RPR_HYDRA_RENDER_PT_quality_viewport(ViewportPanel):
 
         quality = self.settings(context).interactive_quality
         layout.prop(quality, "max_ray_depth")
-        layout.prop(quality, "enable_downscale")
+        row = layout.row()
+        row.enabled = not quality.adaptive_downscale
+        row.prop(quality, "enable_downscale")
         layout.prop(quality, "resolution_downscale")
 
+        col = layout.column(align=True)
+        col.prop(quality, "adaptive_downscale")
+        col = col.column(align=True)
+        col.enabled = quality.adaptive_downscale
+        col.prop(quality, "target_frame_time")
+        col.prop(quality, "adaptive_ray_depth")
+
 
 class RPR_HYDRA_RENDER_PT_denoise_viewport(ViewportPanel):
     bl_label = ""
@@ -0,0 +1,233 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+import time
+import weakref
+
+import bpy
+
+from . import logging
+log = logging.Log("viewport")
+
+
+FRAME_TIME_SMOOTHING = 0.3  # weight of the last frame interval in the moving average
+RAISE_THRESHOLD = 1.25      # level is raised when frame time exceeds target by this factor
+LOWER_THRESHOLD = 0.35      # level is lowered below this share of target: one downscale step less
+                            # renders up to 4 times more pixels
+HOLD_TIME = 0.5             # frame time is measured again for this time after level change
+SETTLE_TIME = 0.5           # view is settled when it isn't moved or edited for this time
+MAX_FRAME_INTERVAL = 1.0    # longer intervals between frames are pauses, not frames
+
+
+class ViewportController:
+    """
+    Adapts viewport render settings to user activity: the view is moved or the scene is edited.
+
+    Adaptive resolution keeps viewport frame time near the target. Level goes from 0
+    (full resolution) through resolution_downscale of interactive quality settings, then it lowers
+    max ray depth, if adaptive ray depth is enabled. Level is used while the view is active,
+    full quality is restored when the view settles, the level is kept for the next navigation.
+
+    Auto quality renders with HybridPro while the view is active and switches to Northstar,
+    when the view is idle for idle_time of render settings.
+
+    Idle suspension stops sampling, when the view isn't active for suspend_time of render settings:
+    the viewport isn't navigated or edited, it is also the case when Blender window is unfocused
+    or the viewport is hidden. Sampling is resumed on the next activity.
+    """
+
+    def __init__(self, on_change):
+        # bound method of the render engine, which is called when settings have to be delivered to it.
+        # Registered timer holds the controller, so it shouldn't keep the render engine alive
+        self._on_change = weakref.WeakMethod(on_change)
+
+        self.level = 0
+        self.frame_time = 0.0
+        self.is_settled = True
+        self.is_idle = True
+        self.idle_time = 0.0
+        self.is_suspended = False
+        self.suspend_time = None
+        # total time of suspended sampling
+        self.suspended_time = 0.0
+        self._suspend_start_time = 0.0
+        self._view = None
+        self._last_frame_time = None
+        self._last_move_time = 0.0
+        self._last_change_time = 0.0
+
+        # bpy.app.timers identifies timers by function object, so keep one bound method
+        self._timer = self._on_timer
+
+    @staticmethod
+    def is_enabled(settings):
+        return settings.auto_quality or settings.interactive_quality.adaptive_downscale or \
+            settings.idle_suspend
+
+    @staticmethod
+    def get_max_level(quality):
+        max_ray_depth_drop = quality.max_ray_depth - 1 if quality.adaptive_ray_depth else 0
+        return quality.resolution_downscale + max_ray_depth_drop
+
+    def get_render_settings(self, settings):
+        """Returns render settings, which override settings of viewport RenderSettings"""
+        result = {}
+        quality = settings.interactive_quality
+        if quality.adaptive_downscale:
+            level = 0 if self.is_settled else min(self.level, self.get_max_level(quality))
+            downscale = min(level, quality.resolution_downscale)
+            result |= {
+                'rpr:quality:interactive:downscale:enable': True,
+                'rpr:quality:interactive:downscale:resolution': downscale,
+                'rpr:quality:interactive:rayDepth': max(quality.max_ray_depth - (level - downscale), 1),
+            }
+
+        if settings.auto_quality:
+            if self.is_idle:
+                result['rpr:core:renderQuality'] = 'Northstar'
+                result['rpr:quality:imageFilterRadius'] = settings.quality.pixel_filter_width
+            else:
+                result['rpr:core:renderQuality'] = 'HybridPro'
+
+        if self.is_suspended:
+            # render is completed when it has max samples, the accumulated image is kept
+            result['rpr:maxSamples'] = 1
+
+        return result
+
+    def on_activity(self, now, settings):
+        """Is called on scene edits. Returns True if render settings are changed"""
+        return self._move(now, settings)
+
+    def on_frame(self, now, view, settings):
+        """
+        Is called on viewport draw with view state, which is compared to detect navigation.
+        Returns True if render settings are changed.
+        """
+        interval = now - self._last_frame_time if self._last_frame_time is not None else None
+        self._last_frame_time = now
+
+        if self._view is None:
+            # the first frame of the engine
+            self._view = view
+            return False
+
+        changed = False
+        if view != self._view:
+            self._view = view
+            was_settled = self.is_settled
+            changed = self._move(now, settings)
+            if was_settled:
+                # interval since the last frame of the settled view isn't a navigation frame
+                return changed
+
+        quality = settings.interactive_quality
+        if not quality.adaptive_downscale or self.is_settled or \
+                interval is None or interval > MAX_FRAME_INTERVAL:
+            return changed
+
+        self.frame_time = interval if not self.frame_time else \
+            self.frame_time + (interval - self.frame_time) * FRAME_TIME_SMOOTHING
+        if now - self._last_change_time < HOLD_TIME:
+            return changed
+
+        level = min(self.level, self.get_max_level(quality))
+        if self.frame_time > quality.target_frame_time * RAISE_THRESHOLD:
+            level = min(level + 1, self.get_max_level(quality))
+        elif self.frame_time < quality.target_frame_time * LOWER_THRESHOLD:
+            level = max(level - 1, 0)
+
+        if level == self.level:
+            return changed
+
+        log("Viewport level is changed", self.level, level, f"frame time: {self.frame_time:.3f}")
+        self.level = level
+        self.frame_time = 0.0
+        self._last_change_time = now
+        return True
+
+    def _move(self, now, settings):
+        self._last_move_time = now
+        changed = (self.is_settled and self.level > 0 and settings.interactive_quality.adaptive_downscale) or \
+            (self.is_idle and settings.auto_quality) or self.is_suspended
+        if self.is_suspended:
+            self.is_suspended = False
+            suspended_time = now - self._suspend_start_time
+            self.suspended_time += suspended_time
+            log("Viewport sampling is resumed",
+                f"reclaimed device time: {suspended_time:.1f} s, total: {self.suspended_time:.1f} s")
+
+        self.is_settled = False
+        # view is idle all the time, when auto quality is disabled
+        self.is_idle = not settings.auto_quality
+        self.idle_time = settings.idle_time
+        self.suspend_time = settings.suspend_time if settings.idle_suspend else None
+
+        if not bpy.app.timers.is_registered(self._timer):
+            bpy.app.timers.register(self._timer, first_interval=SETTLE_TIME)
+
+        return changed
+
+    def _on_timer(self):
+        """Settles, idles and then suspends the view, when it isn't active"""
+        now = time.perf_counter()
+        inactive_time = now - self._last_move_time
+        changed = False
+        if not self.is_settled and inactive_time >= SETTLE_TIME:
+            self.is_settled = True
+            self.frame_time = 0.0
+            changed = self.level > 0
+
+        if not self.is_idle and inactive_time >= self.idle_time:
+            log("Viewport is idle", f"{inactive_time:.1f}")
+            self.is_idle = True
+            changed = True
+
+        if self.suspend_time is not None and not self.is_suspended and inactive_time >= self.suspend_time:
+            log("Viewport sampling is suspended", f"{inactive_time:.1f}")
+            self.is_suspended = True
+            self._suspend_start_time = now
+            changed = True
+
+        on_change = self._on_change()
+        if not on_change:
+            # render engine is already deleted
+            return None
+
+        if changed:
+            try:
+                on_change()
+
+            except ReferenceError:
+                # render engine is already freed
+                return None
+
+        thresholds = [t for t in (SETTLE_TIME, self.idle_time, self.suspend_time)
+                      if t is not None and t > inactive_time]
+        if not thresholds:
+            return None
+
+        return max(min(thresholds) - inactive_time, 0.01)
+
+    def stop(self):
+        if bpy.app.timers.is_registered(self._timer):
+            bpy.app.timers.unregister(self._timer)
+
+
+def tag_redraw():
+    """Redraws 3D viewports, so that Blender calls view_update of render engines tagged for update"""
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
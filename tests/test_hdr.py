@@ -0,0 +1,111 @@
+# **********************************************************************
+# Copyright 2023 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+"""
+Tests of render_studio.world.hdr encoder against hand-built Radiance RGBE data.
+Run with: python -m pytest tests
+"""
+from pathlib import Path
+import importlib.util
+
+import numpy as np
+import pytest
+
+
+HDR_MODULE = Path(__file__).parents[1] / "src/hydrarpr/render_studio/world/hdr.py"
+
+# pixels which are exactly representable in RGBE
+WHITE = (1.0, 1.0, 1.0)         # 128 128 128 129
+ORANGE = (0.5, 0.25, 0.0)       # 128  64   0 128
+RED = (2.0, 0.0, 0.0)           # 128   0   0 130
+BLACK = (0.0, 0.0, 0.0)         #   0   0   0   0
+
+
+def header(height, width):
+    return b"#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n" + f"-Y {height} +X {width}\n".encode()
+
+
+@pytest.fixture(scope="module")
+def hdr():
+    # imported by path, hydrarpr package requires bpy
+    spec = importlib.util.spec_from_file_location("hdr", HDR_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_flat_scanlines(hdr):
+    # scanlines narrower than 8 pixels are written flat, rows go from top to bottom
+    rgb = np.array([[WHITE, BLACK],
+                    [ORANGE, RED]], dtype=np.float32)
+
+    expected = header(2, 2) + bytes((
+        128, 128, 128, 129,     0, 0, 0, 0,
+        128, 64, 0, 128,        128, 0, 0, 130,
+    ))
+    assert hdr.encode(rgb) == expected
+
+
+def test_rle_scanlines(hdr):
+    rgb = np.array([[WHITE] * 5 + [ORANGE] + [BLACK] * 2,
+                    [BLACK] * 8], dtype=np.float32)
+
+    expected = header(2, 8) + bytes((
+        # top row: scanline header, then each channel as runs (128 + count, value)
+        # and literals (count, values...), runs shorter than 4 are written as literals
+        2, 2, 0, 8,
+        134, 128,   2, 0, 0,                # R: 128 x6, 0 0
+        133, 128,   3, 64, 0, 0,            # G: 128 x5, 64 0 0
+        133, 128,   3, 0, 0, 0,             # B: 128 x5, 0 0 0
+        133, 129,   3, 128, 0, 0,           # E: 129 x5, 128 0 0
+        # bottom row
+        2, 2, 0, 8,
+        136, 0,     136, 0,     136, 0,     136, 0,
+    ))
+    assert hdr.encode(rgb) == expected
+
+
+def test_long_rle_scanline(hdr):
+    # runs are split by 127 pixels, literals by 128 pixels, width is written big-endian
+    width = 300
+    rgb = np.empty((1, width, 3), dtype=np.float32)
+    rgb[0, :130] = WHITE
+    # blue alternates between 129 and 128 with the same red, green and exponent
+    rgb[0, 130:] = [(1.0, 1.0, 1.0 + 2.0 * ((x + 1) % 2) / 256) for x in range(width - 130)]
+    blue = bytes(129 - x % 2 for x in range(width - 130))
+
+    expected = header(1, width) + bytes((
+        2, 2, 1, 44,
+        255, 128,   255, 128,   174, 128,   # R: 128 x300
+        255, 128,   255, 128,   174, 128,   # G: 128 x300
+        255, 128,   131, 128,               # B: 128 x130, then literals
+        128, *blue[:128],
+        42, *blue[128:],
+        255, 129,   255, 129,   174, 129,   # E: 129 x300
+    ))
+    assert hdr.encode(rgb) == expected
+
+
+def test_read_hdr(hdr, tmp_path):
+    filepath = tmp_path / "image.hdr"
+    rgb = np.array([[WHITE] * 5 + [ORANGE] + [BLACK] * 2,
+                    [RED] * 8], dtype=np.float32)
+
+    hdr.write_hdr(filepath, rgb)
+    # RGBE has 8 bit mantissa shared by all channels, which is decoded with half step offset
+    np.testing.assert_allclose(hdr.read_hdr(filepath), rgb, atol=rgb.max() / 128)
+
+    filepath.write_bytes(filepath.read_bytes().replace(b"-Y 2 +X 8", b"+Y 2 +X 8"))
+    with pytest.raises(ValueError):
+        hdr.read_hdr(filepath)